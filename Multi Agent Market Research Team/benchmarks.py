@@ -0,0 +1,574 @@
+"""
+Benchmarks for the inventory tools and plan executors in inventory_utils.
+
+Run from this folder:
+
+    python benchmarks.py                      # full suite, 1k to 1M SKUs
+    python benchmarks.py --quick              # small sizes, for a smoke run
+    python benchmarks.py --output results.json
+
+Results are written as JSON (with the git commit, when available) so runs
+can be compared across commits. LLM calls go to MockChatClient, a local
+stand-in for client.chat.completions.create with configurable latency.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+import weakref
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from inventory_schema import compact_inventory, compact_ledger, pyarrow
+from inventory_store import InventoryStore, MmapInventoryStore
+from plan_utils import ToolResultCache
+from inventory_utils import (
+    check_inventory_by_name,
+    create_ledger,
+    create_ledger_dataframe,
+    execute_plan,
+    execute_plan_with_reflection,
+    get_formatted_item_names,
+    get_low_stock_items,
+    sell_if_in_stock,
+    update_stock,
+)
+
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+QUICK_SIZES = (1_000, 10_000)
+
+
+class MockChatClient:
+    """
+    Local stand-in for an OpenAI client: client.chat.completions.create(...) sleeps
+    for `latency` seconds and returns a canned reply with a `usage` block.
+
+    Replies are taken from `replies` in order, then `default_reply` forever.
+    With stream=True the reply is returned as a list of delta chunks, followed by
+    a usage chunk if stream_options={"include_usage": True}.
+    """
+
+    def __init__(self, latency=0.05, replies=None, default_reply="REASONING: Plan looks fine.\nPLAN: NO_CHANGES_NEEDED"):
+        self.latency = latency
+        self.replies = list(replies or [])
+        self.default_reply = default_reply
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=(), stream=False, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        content = self.replies.pop(0) if self.replies else self.default_reply
+        prompt_tokens = sum(len(message.get("content", "")) for message in messages) // 4
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=len(content) // 4,
+            total_tokens=prompt_tokens + len(content) // 4,
+        )
+
+        if stream:
+            chunks = [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + 16]))])
+                for i in range(0, len(content), 16)
+            ]
+            if (kwargs.get("stream_options") or {}).get("include_usage"):
+                chunks.append(SimpleNamespace(choices=[], usage=usage))
+            return chunks
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+
+def make_synthetic_inventory(n_items, seed=42):
+    """
+    Build a synthetic inventory with the create_inventory_dataframe() schema.
+
+    Args:
+        n_items (int): Number of SKUs to generate
+        seed (int): Seed for the random quantities and prices
+
+    Returns:
+        pd.DataFrame: Inventory with `n_items` uniquely named rows
+    """
+    rng = np.random.default_rng(seed)
+    skus = np.arange(n_items)
+    return pd.DataFrame({
+        'name': [f"Style {i}" for i in skus],
+        'item_id': [f"SG{i:07d}" for i in skus],
+        'description': [f"Synthetic sunglasses style number {i}." for i in skus],
+        'quantity_in_stock': rng.integers(3, 26, size=n_items),
+        'price': rng.integers(75, 151, size=n_items),
+    })
+
+
+def _time_calls(func, args_list):
+    """Return the mean seconds per call of `func` over `args_list`."""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list)
+
+
+def benchmark_name_lookup(sizes=(1_000, 100_000, 1_000_000), n_scan_lookups=20, n_index_lookups=10_000):
+    """
+    Compare check_inventory_by_name on a DataFrame (mask scan) with an InventoryStore (hash index).
+
+    Returns:
+        list: One dict per inventory size with mean microseconds per lookup
+    """
+    rng = np.random.default_rng(0)
+    results = []
+
+    for n_items in sizes:
+        df = make_synthetic_inventory(n_items)
+        build_start = time.perf_counter()
+        store = InventoryStore(df)
+        build_s = time.perf_counter() - build_start
+
+        # Query with a different case than stored to exercise the case-folding
+        names = df['name'].str.upper().to_numpy()
+        scan_names = rng.choice(names, size=n_scan_lookups)
+        index_names = rng.choice(names, size=n_index_lookups)
+
+        scan_us = _time_calls(check_inventory_by_name, [(df, name) for name in scan_names]) * 1e6
+        index_us = _time_calls(check_inventory_by_name, [(store, name) for name in index_names]) * 1e6
+
+        results.append({
+            'n_items': n_items,
+            'mask_scan_us': scan_us,
+            'indexed_us': index_us,
+            'index_build_ms': build_s * 1e3,
+            'speedup': scan_us / index_us,
+        })
+        print(
+            f"{n_items:>9,} items | mask scan {scan_us:>12,.1f} us | "
+            f"indexed {index_us:>6.2f} us | index build {build_s * 1e3:>8.1f} ms | "
+            f"{scan_us / index_us:>10,.0f}x"
+        )
+
+    return results
+
+
+def benchmark_ledger_appends(n_rows=1_000_000, n_items=5_000, n_dataframe_rows=2_000):
+    """
+    Time SalesLedger appends and compare its memory with an object-dtype ledger DataFrame.
+
+    Returns:
+        dict: Appends per second for both ledgers and their memory footprint in bytes
+    """
+    rng = np.random.default_rng(0)
+    item_ids = [f"SG{i:07d}" for i in range(n_items)]
+    transaction_date = pd.Timestamp("2025-01-15")
+    rows = [
+        (transaction_date, item_ids[code], int(quantity), 'sale' if is_sale else 'return')
+        for code, quantity, is_sale in zip(
+            rng.integers(0, n_items, size=n_rows),
+            rng.integers(1, 10, size=n_rows),
+            rng.random(n_rows) < 0.9,
+        )
+    ]
+
+    ledger = create_ledger()
+    append = ledger.append
+    start = time.perf_counter()
+    for row in rows:
+        append(*row)
+    ledger_rate = n_rows / (time.perf_counter() - start)
+    ledger_bytes = ledger.to_dataframe().memory_usage(deep=True).sum()
+
+    # Growing a DataFrame row by row is quadratic, so only time a small prefix
+    df = create_ledger_dataframe()
+    start = time.perf_counter()
+    for i, row in enumerate(rows[:n_dataframe_rows]):
+        df.loc[i] = row
+    dataframe_rate = n_dataframe_rows / (time.perf_counter() - start)
+
+    object_bytes = pd.DataFrame(rows, columns=df.columns, dtype=object).memory_usage(deep=True).sum()
+
+    print(f"SalesLedger.append:     {ledger_rate:>12,.0f} rows/s ({n_rows:,} rows)")
+    print(f"DataFrame.loc append:   {dataframe_rate:>12,.0f} rows/s ({n_dataframe_rows:,} rows)")
+    print(f"Memory, object frame:   {object_bytes / 1e6:>12,.1f} MB")
+    print(f"Memory, SalesLedger:    {ledger_bytes / 1e6:>12,.1f} MB ({ledger_bytes / object_bytes:.1%})")
+
+    return {
+        'n_rows': n_rows,
+        'ledger_appends_per_s': ledger_rate,
+        'dataframe_appends_per_s': dataframe_rate,
+        'object_frame_bytes': int(object_bytes),
+        'ledger_frame_bytes': int(ledger_bytes),
+    }
+
+
+def benchmark_mmap_store(n_items=1_000_000, n_lookups=10_000):
+    """
+    Time opening a persisted MmapInventoryStore and using it through the inventory tools.
+
+    Returns:
+        dict: Build and open time in ms, and microseconds per check/update call
+    """
+    df = make_synthetic_inventory(n_items)
+    rng = np.random.default_rng(0)
+    names = rng.choice(df['name'].to_numpy(), size=n_lookups)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'inventory')
+        start = time.perf_counter()
+        MmapInventoryStore.create(path, df)
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        store = MmapInventoryStore(path)
+        open_s = time.perf_counter() - start
+
+        check_us = _time_calls(check_inventory_by_name, [(store, name) for name in names]) * 1e6
+        update_us = _time_calls(update_stock, [(store, name, 'sale', 1) for name in names]) * 1e6
+        store.flush()
+        del store
+
+    print(f"{n_items:>9,} items | build {build_s * 1e3:>9,.1f} ms | open {open_s * 1e3:>6.2f} ms | "
+          f"check {check_us:>6.2f} us | update {update_us:>6.2f} us")
+    return {
+        'n_items': n_items,
+        'build_ms': build_s * 1e3,
+        'open_ms': open_s * 1e3,
+        'check_us': check_us,
+        'update_us': update_us,
+    }
+
+
+def benchmark_low_stock(sizes=(10_000, 100_000, 1_000_000), threshold=5, k=10, n_calls=200):
+    """
+    Time get_low_stock_items on a DataFrame (full scan) and an InventoryStore (low-stock index).
+
+    Returns:
+        list: One dict per size with mean seconds per query and per update_stock
+    """
+    results = []
+    for n_items in sizes:
+        df = make_synthetic_inventory(n_items)
+        store = InventoryStore(df)
+        start = time.perf_counter()
+        get_low_stock_items(store, threshold, k)
+        build_time = time.perf_counter() - start
+
+        n_scans = n_calls if n_items <= 100_000 else max(n_calls // 10, 5)
+        scan_time = _time_calls(get_low_stock_items, [(df, threshold, k)] * n_scans)
+        index_time = _time_calls(get_low_stock_items, [(store, threshold, k)] * n_calls)
+        names = df['name'].to_numpy()[np.random.default_rng(2).integers(0, n_items, size=n_calls)]
+        update_time = _time_calls(update_stock, [(store, name, 'sale', 1) for name in names])
+
+        results.append({
+            'n_items': n_items,
+            'scan_s': scan_time,
+            'indexed_s': index_time,
+            'index_build_s': build_time,
+            'indexed_update_stock_s': update_time,
+        })
+        print(
+            f"{n_items:>9,} items | scan {scan_time * 1e6:>10,.1f} us | indexed {index_time * 1e6:>6,.1f} us | "
+            f"index build {build_time * 1e3:>7,.1f} ms | update_stock {update_time * 1e6:>5,.1f} us"
+        )
+    return results
+
+
+def benchmark_memory(n_items=1_000_000, n_ledger_rows=1_000_000):
+    """
+    Compare the memory of default and compact (inventory_schema) inventory and ledger frames.
+
+    Returns:
+        dict: Deep memory in bytes of each frame before and after compaction
+    """
+    inventory = make_synthetic_inventory(n_items)
+    inventory['price'] = inventory['price'].astype(np.float64)
+    rng = np.random.default_rng(0)
+    ledger = pd.DataFrame({
+        'transaction_date': pd.Timestamp("2025-01-15") + pd.to_timedelta(rng.integers(0, 365, n_ledger_rows), unit='D'),
+        'item_id': inventory['item_id'].to_numpy()[rng.integers(0, min(n_items, 5_000), n_ledger_rows)],
+        'quantity': rng.integers(1, 10, n_ledger_rows),
+        'transaction_type': np.where(rng.random(n_ledger_rows) < 0.9, 'sale', 'return'),
+    }).astype(object)  # what create_ledger_dataframe() grows into
+
+    results = {'pyarrow': pyarrow is not None}
+    for label, frame, compact in (
+        ('inventory', inventory, compact_inventory),
+        ('ledger', ledger, compact_ledger),
+    ):
+        before = int(frame.memory_usage(deep=True).sum())
+        after = int(compact(frame).memory_usage(deep=True).sum())
+        results[f'{label}_bytes'] = before
+        results[f'{label}_compact_bytes'] = after
+        print(f"{label:<9} {len(frame):>9,} rows | default {before / 1e6:>8,.1f} MB | "
+              f"compact {after / 1e6:>8,.1f} MB | {before / after:>5.1f}x")
+    if pyarrow is None:
+        print("pyarrow is not installed, so text columns were left as they are")
+    return results
+
+
+def _run_threads(n_threads, target):
+    """Run target(thread_index) on `n_threads` threads and return the wall time in seconds."""
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def benchmark_concurrent_updates(thread_counts=(1, 2, 4, 8), updates_per_thread=50_000, n_items=10_000):
+    """
+    Hammer an InventoryStore from several threads and check that no update is lost.
+
+    Two workloads per thread count:
+        disjoint: each thread returns 1 unit at a time to its own items
+        contended: every thread calls sell_if_in_stock on one shared item
+
+    Returns:
+        list: One dict per thread count with throughput and lost-update checks
+    """
+    results = []
+    for n_threads in thread_counts:
+        df = make_synthetic_inventory(n_items)
+        df['quantity_in_stock'] = 0
+        store = InventoryStore(df)
+        names = df['name'].tolist()
+
+        def disjoint_worker(thread_index):
+            own_names = names[thread_index::n_threads]
+            for i in range(updates_per_thread):
+                update_stock(store, own_names[i % len(own_names)], 'return', 1)
+
+        disjoint_s = _run_threads(n_threads, disjoint_worker)
+        expected_total = n_threads * updates_per_thread
+        lost_updates = expected_total - int(store.to_dataframe()['quantity_in_stock'].sum())
+
+        shared_name = names[0]
+        stock_before = int(check_inventory_by_name(store, shared_name))
+        sold = [0] * n_threads
+
+        def contended_worker(thread_index):
+            for _ in range(updates_per_thread):
+                sold[thread_index] += sell_if_in_stock(store, shared_name, 1)
+
+        contended_s = _run_threads(n_threads, contended_worker)
+        oversold = sum(sold) - (stock_before - int(check_inventory_by_name(store, shared_name)))
+
+        results.append({
+            'threads': n_threads,
+            'disjoint_updates_per_s': expected_total / disjoint_s,
+            'contended_sells_per_s': n_threads * updates_per_thread / contended_s,
+            'lost_updates': lost_updates,
+            'oversold': oversold,
+        })
+        print(
+            f"{n_threads} threads | disjoint {expected_total / disjoint_s:>10,.0f} updates/s | "
+            f"contended {n_threads * updates_per_thread / contended_s:>10,.0f} sells/s | "
+            f"lost updates {lost_updates} | oversold {oversold}"
+        )
+
+    return results
+
+
+def make_synthetic_plan(df, n_steps=20, seed=0):
+    """
+    Build a plan of check_inventory_by_name / update_stock steps over random items in `df`.
+
+    Returns:
+        list: Task dictionaries with 'task' and 'args' keys
+    """
+    rng = np.random.default_rng(seed)
+    names = rng.choice(df['name'].to_numpy(), size=n_steps)
+    plan = []
+    for i, name in enumerate(names):
+        if i % 3 == 2:
+            plan.append({'task': 'update_stock', 'args': {
+                'df': 'inventory_df', 'item_name': str(name), 'transaction_type': 'sale', 'quantity': 1,
+            }})
+        else:
+            plan.append({'task': 'check_inventory_by_name', 'args': {'df': 'inventory_df', 'item_name': str(name)}})
+    return plan
+
+
+AVAILABLE_FUNCTIONS = {
+    'get_formatted_item_names': get_formatted_item_names,
+    'check_inventory_by_name': check_inventory_by_name,
+    'update_stock': update_stock,
+}
+
+
+def _quietly(func, *args, **kwargs):
+    """Call func with its print output swallowed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def benchmark_tools(sizes=DEFAULT_SIZES, n_calls=200, n_plan_steps=20, llm_latency=0.05, reflection_sizes=None):
+    """
+    Time the inventory tools and plan executors on DataFrame and InventoryStore inventories.
+
+    Args:
+        sizes (tuple): Inventory sizes (number of SKUs) to test
+        n_calls (int): Calls per tool timing
+        n_plan_steps (int): Steps in the synthetic plan
+        llm_latency (float): Seconds per MockChatClient call
+        reflection_sizes (tuple): Sizes to run execute_plan_with_reflection on
+                                  (defaults to the smallest size; it is latency-bound)
+
+    Returns:
+        list: One dict per (size, backend) with mean seconds per call / per plan
+    """
+    reflection_sizes = reflection_sizes if reflection_sizes is not None else sizes[:1]
+    results = []
+
+    for n_items in sizes:
+        base_df = make_synthetic_inventory(n_items)
+        plan = make_synthetic_plan(base_df, n_plan_steps)
+        names = np.random.default_rng(1).choice(base_df['name'].to_numpy(), size=n_calls)
+
+        for backend in ('dataframe', 'store'):
+            inventory = base_df.copy() if backend == 'dataframe' else InventoryStore(base_df)
+            # The mask scan gets slow at scale, so time fewer calls there
+            n = n_calls if backend == 'store' or n_items <= 100_000 else max(n_calls // 10, 5)
+
+            row = {
+                'n_items': n_items,
+                'backend': backend,
+                'check_inventory_by_name_s': _time_calls(check_inventory_by_name, [(inventory, name) for name in names[:n]]),
+                'update_stock_s': _time_calls(update_stock, [(inventory, name, 'return', 1) for name in names[:n]]),
+            }
+
+            start = time.perf_counter()
+            _quietly(execute_plan, plan, inventory, AVAILABLE_FUNCTIONS)
+            row['execute_plan_s'] = time.perf_counter() - start
+
+            if n_items in reflection_sizes:
+                client = MockChatClient(latency=llm_latency)
+                start = time.perf_counter()
+                _quietly(
+                    execute_plan_with_reflection,
+                    client, "benchmark", "", "", plan, AVAILABLE_FUNCTIONS, inventory,
+                )
+                row['execute_plan_with_reflection_s'] = time.perf_counter() - start
+                row['reflection_llm_calls'] = client.calls
+
+            results.append(row)
+            print(
+                f"{n_items:>9,} items | {backend:<9} | check {row['check_inventory_by_name_s'] * 1e6:>10,.1f} us | "
+                f"update {row['update_stock_s'] * 1e6:>10,.1f} us | plan {row['execute_plan_s'] * 1e3:>9,.2f} ms"
+                + (f" | reflection plan {row['execute_plan_with_reflection_s']:.2f} s"
+                   if 'execute_plan_with_reflection_s' in row else "")
+            )
+
+    return results
+
+
+def check_inventory_release(n_runs=5, n_items=100_000, llm_latency=0.0):
+    """
+    Check that a finished execute_plan_with_reflection run (with a tool cache and
+    plan validation) leaves nothing holding on to its inventory.
+
+    Returns:
+        dict: Runs made and how many of their inventories were still alive after gc
+    """
+    base_df = make_synthetic_inventory(n_items)
+    plan = make_synthetic_plan(base_df, n_steps=10)
+    refs = []
+    for _ in range(n_runs):
+        inventory = InventoryStore(base_df)
+        _quietly(
+            execute_plan_with_reflection,
+            MockChatClient(latency=llm_latency), "benchmark", "", "", plan, AVAILABLE_FUNCTIONS, inventory,
+            tool_cache=ToolResultCache(), validate_plan=True,
+        )
+        refs.append(weakref.ref(inventory))
+        del inventory
+    gc.collect()
+    alive = sum(ref() is not None for ref in refs)
+    print(f"{n_runs} runs of {n_items:,} items | inventories still alive after the run: {alive}")
+    return {'runs': n_runs, 'n_items': n_items, 'inventories_alive': alive}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=DEFAULT_SIZES, llm_latency=0.05, output="benchmark_results.json"):
+    """
+    Run every benchmark and write the results to `output` as JSON.
+
+    Returns:
+        dict: The results written to disk
+    """
+    largest = max(sizes)
+    print("check_inventory_by_name / update_stock / execute_plan")
+    tools = benchmark_tools(sizes=sizes, llm_latency=llm_latency)
+    print("\ncheck_inventory_by_name: mask scan vs InventoryStore index")
+    lookup = benchmark_name_lookup(sizes=sizes)
+    print("\nLedger appends: SalesLedger vs DataFrame")
+    ledger = benchmark_ledger_appends(n_rows=largest)
+    print("\nMemory-mapped inventory store")
+    mmap_store = benchmark_mmap_store(n_items=largest)
+    print("\nConcurrent updates on an InventoryStore")
+    concurrency = benchmark_concurrent_updates(n_items=min(largest, 10_000))
+    print("\nget_low_stock_items: scan vs low-stock index")
+    low_stock = benchmark_low_stock(sizes=sizes)
+    print("\nMemory: default vs compact dtypes")
+    memory = benchmark_memory(n_items=largest, n_ledger_rows=largest)
+    print("\nInventory released after a plan run")
+    release = check_inventory_release(n_items=min(largest, 100_000))
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'llm_latency_s': llm_latency,
+        'tools': tools,
+        'name_lookup': lookup,
+        'ledger_appends': ledger,
+        'mmap_store': mmap_store,
+        'concurrent_updates': concurrency,
+        'low_stock': low_stock,
+        'memory': memory,
+        'inventory_release': release,
+    }
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2, default=float)
+    print(f"\nWrote {output}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the inventory tools and plan executors.")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Inventory sizes (SKUs) to benchmark")
+    parser.add_argument("--quick", action="store_true", help=f"Use small sizes {QUICK_SIZES}")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per mock LLM call")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    cli_args = parser.parse_args()
+
+    run_suite(
+        sizes=tuple(cli_args.sizes or (QUICK_SIZES if cli_args.quick else DEFAULT_SIZES)),
+        llm_latency=cli_args.llm_latency,
+        output=cli_args.output,
+    )
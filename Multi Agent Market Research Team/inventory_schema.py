@@ -0,0 +1,172 @@
+"""
+Compact dtypes for the inventory and ledger DataFrames in inventory_utils.
+
+create_inventory_dataframe() and create_ledger_dataframe() use default pandas
+dtypes: object (or plain str) strings, int64 and float64, and an empty ledger
+has no dtypes at all. compact_inventory() and compact_ledger() convert a frame
+to the schemas below, and memory_report() shows what that saves. The tools in
+inventory_utils work the same on compact frames.
+
+Most of an inventory's memory is its text, so the savings there need pyarrow
+('string[pyarrow]' columns); without it only the numeric columns shrink.
+"""
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:  # text columns keep their current dtype
+    pyarrow = None
+
+
+# Column -> dtype. Categories only pay off for repeated values: a 'category'
+# column whose values are mostly distinct (e.g. the names of a large catalog)
+# is stored like 'string[pyarrow]' instead, as one buffer plus offsets.
+# Integer columns are only narrowed when they hold integers: whole-dollar prices
+# (as in create_inventory_dataframe()) become int32, float prices stay float64,
+# so the tools and catalog views show the same values either way.
+INVENTORY_SCHEMA = {
+    'name': 'category',
+    'item_id': 'category',
+    'description': 'string[pyarrow]',
+    'quantity_in_stock': 'int32',
+    'price': 'int32',
+}
+
+LEDGER_SCHEMA = {
+    'transaction_date': 'datetime64[ns]',
+    'item_id': 'category',
+    'quantity': 'int32',
+    'transaction_type': 'category',
+}
+
+
+def _integer_dtype(values, dtype):
+    """`dtype` if every value fits in it, otherwise int64."""
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        return 'int64'
+    return dtype
+
+
+def _mostly_distinct(values):
+    return len(values) > 1 and values.nunique() > len(values) // 2
+
+
+def _apply_schema(df, schema):
+    converted = {}
+    skipped = []
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        if dtype == 'category' and _mostly_distinct(df[column]):
+            dtype = 'string[pyarrow]'
+        if dtype == 'string[pyarrow]':
+            if pyarrow is None:
+                skipped.append(column)
+                continue
+        elif dtype.startswith('int'):
+            if df[column].dtype.kind == 'f':
+                continue
+            dtype = _integer_dtype(df[column].to_numpy(), dtype)
+        converted[column] = df[column].astype(dtype)
+
+    compact = df.assign(**converted)
+    compact.attrs = dict(df.attrs)
+    if skipped:
+        warnings.warn(
+            f"pyarrow is not installed, so text columns {skipped} were not compacted "
+            "(pip install pyarrow for most of the savings)",
+            stacklevel=3,
+        )
+        compact.attrs['uncompacted_columns'] = skipped
+    return compact
+
+
+def compact_inventory(df):
+    """
+    Convert an inventory DataFrame to INVENTORY_SCHEMA.
+
+    The columns and their values stay the same. Integer columns fall back to
+    int64 if a value does not fit in int32. Text columns that would be Arrow
+    strings keep their dtype if pyarrow is not installed; a warning says so and
+    the result lists them in attrs['uncompacted_columns'].
+
+    Args:
+        df (pd.DataFrame): Inventory with the create_inventory_dataframe() columns
+
+    Returns:
+        pd.DataFrame: A compact copy; df.attrs (e.g. the inventory version) are kept
+    """
+    return _apply_schema(df, INVENTORY_SCHEMA)
+
+
+def expand_inventory(df):
+    """
+    Convert a compact inventory back to the create_inventory_dataframe() dtypes.
+
+    Returns:
+        pd.DataFrame: A copy with object/str text columns and int64 stock
+    """
+    expanded = df.copy()
+    for column in ('name', 'item_id', 'description'):
+        if column in expanded.columns:
+            expanded[column] = expanded[column].astype(object).astype(str)
+    expanded['quantity_in_stock'] = expanded['quantity_in_stock'].astype('int64')
+    return expanded
+
+
+def compact_ledger(df):
+    """
+    Convert a ledger DataFrame (e.g. from create_ledger_dataframe()) to LEDGER_SCHEMA.
+
+    Compact a ledger once it has been filled: rows added one at a time with
+    `ledger.loc[len(ledger)] = row` bring back default dtypes. To grow a compact
+    ledger row by row, use inventory_utils.create_ledger() (a SalesLedger) instead.
+
+    Returns:
+        pd.DataFrame: A compact copy
+    """
+    return _apply_schema(df, LEDGER_SCHEMA)
+
+
+def memory_report(df, other=None):
+    """
+    Deep memory usage per column, optionally next to a second version of the frame.
+
+    Args:
+        df (pd.DataFrame): Frame to measure
+        other (pd.DataFrame): Optional second frame, e.g. compact_inventory(df)
+
+    Returns:
+        pd.DataFrame: dtype and bytes per column plus a 'TOTAL' row; with `other`,
+                      also its dtype and bytes, the ratio df bytes / other bytes and
+                      a 'note' marking columns left uncompacted for lack of pyarrow
+    """
+    def measure(frame):
+        usage = frame.memory_usage(index=True, deep=True)
+        dtypes = frame.dtypes.astype(str).reindex(usage.index).fillna('')
+        usage['TOTAL'] = usage.sum()
+        dtypes['TOTAL'] = ''
+        return pd.DataFrame({'dtype': dtypes, 'bytes': usage})
+
+    report = measure(df)
+    if other is None:
+        return report
+
+    # Columns are lined up by position, in case the two frames name them differently
+    other_report = measure(other)
+    report = pd.concat(
+        [report.reset_index(names='column'), other_report.reset_index(names='other_column')
+         .rename(columns={'dtype': 'other_dtype', 'bytes': 'other_bytes'})],
+        axis=1,
+    ).set_index('column')
+    report['ratio'] = report['bytes'] / report['other_bytes']
+    uncompacted = set(df.attrs.get('uncompacted_columns', ())) | set(other.attrs.get('uncompacted_columns', ()))
+    report['note'] = [
+        'not compacted: needs pyarrow' if column in uncompacted else '' for column in report['other_column']
+    ]
+    return report
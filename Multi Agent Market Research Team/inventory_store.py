@@ -0,0 +1,746 @@
+"""
+Indexed inventory store for the inventory tools in inventory_utils.
+
+The plain inventory DataFrame answers every name lookup with a full
+`df['name'].str.lower()` scan. InventoryStore wraps the same DataFrame and
+keeps hash indexes from the lower-cased item name and from the item_id to the
+row position, so the tools can find an item in O(1).
+
+MmapInventoryStore keeps the same interface on top of files in a directory:
+fixed-width columns are memory-mapped NumPy arrays updated in place, and the
+text columns live in separate string heaps, so a large catalog opens without
+being rebuilt or loaded into memory.
+"""
+
+import bisect
+import itertools
+import json
+import os
+import threading
+
+from contextlib import ExitStack
+
+import numpy as np
+import pandas as pd
+
+
+INVENTORY_COLUMNS = ['name', 'item_id', 'description', 'quantity_in_stock', 'price']
+
+
+def _whole_units(value):
+    """`value` as an int, raising TypeError (as the DataFrame tools do) if it is not a whole number."""
+    if value % 1 != 0:
+        raise TypeError(f"Invalid stock change {value!r}: stock is counted in whole units")
+    return int(value)
+
+
+class LowStockIndex:
+    """
+    Row positions grouped by stock level, with the distinct levels kept sorted.
+
+    Moving a row to a new level is a set update plus a binary search of the
+    levels, so stores can keep it current on every stock change. Queries walk
+    the levels from the bottom and cost time proportional to the rows returned,
+    instead of a scan of every item.
+    """
+
+    def __init__(self, quantities):
+        """
+        Args:
+            quantities (np.ndarray): Stock level of each row
+        """
+        quantities = np.asarray(quantities)
+        order = np.argsort(quantities, kind='stable')
+        levels, starts = np.unique(quantities[order], return_index=True)
+        bounds = list(starts[1:]) + [len(order)]
+        self._rows = {
+            int(level): set(order[start:end].tolist())
+            for level, start, end in zip(levels, starts, bounds)
+        }
+        self._levels = sorted(self._rows)
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows.values())
+
+    def add(self, row, quantity):
+        rows = self._rows.get(quantity)
+        if rows is None:
+            rows = self._rows[quantity] = set()
+            bisect.insort(self._levels, quantity)
+        rows.add(row)
+
+    def remove(self, row, quantity):
+        rows = self._rows[quantity]
+        rows.discard(row)
+        if not rows:
+            del self._rows[quantity]
+            del self._levels[bisect.bisect_left(self._levels, quantity)]
+
+    def move(self, row, old_quantity, new_quantity):
+        if old_quantity != new_quantity:
+            self.remove(row, old_quantity)
+            self.add(row, new_quantity)
+
+    def lowest(self, threshold=None, k=None):
+        """
+        Rows in ascending stock order. Ties are in row order, except that when k
+        cuts a level short the rows kept from it are not necessarily the first ones.
+
+        Args:
+            threshold (int): Only rows with stock below this level
+            k (int): At most this many rows
+
+        Returns:
+            list: (row, quantity) tuples
+        """
+        end = len(self._levels) if threshold is None else bisect.bisect_left(self._levels, threshold)
+        found = []
+        for level in self._levels[:end]:
+            if k is None:
+                rows = sorted(self._rows[level])
+            elif len(found) < k:
+                # Take any rows of a partly used level rather than sorting all of it
+                rows = sorted(itertools.islice(self._rows[level], k - len(found)))
+            else:
+                break
+            found.extend((row, level) for row in rows)
+        return found
+
+
+class InventoryStore:
+    """
+    Inventory DataFrame plus name and item_id indexes that stay in sync with it.
+
+    Pass the store anywhere an inventory DataFrame is expected: the tools in
+    inventory_utils detect it and use the indexes instead of scanning the
+    'name' column.
+
+    Stock levels live in a NumPy array guarded by striped locks (row % number
+    of stripes), so agents on different threads can update the store without
+    losing writes, and updates to different items rarely contend.
+    """
+
+    def __init__(self, df, lock_stripes=64):
+        """
+        Args:
+            df (pd.DataFrame): Inventory DataFrame with the columns produced by
+                create_inventory_dataframe()
+            lock_stripes (int): Number of locks shared out across the rows
+        """
+        self._df = df.reset_index(drop=True)
+        self._quantities = self._df['quantity_in_stock'].to_numpy(copy=True)
+        self._name_index = {}
+        self._id_index = {}
+        self._rebuild_indexes()
+        self._init_locks(lock_stripes)
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __repr__(self):
+        return f"InventoryStore({len(self)} items)"
+
+    @property
+    def df(self):
+        """Snapshot of the inventory as a DataFrame, with current stock levels."""
+        return self.to_dataframe()
+
+    @property
+    def version(self):
+        """Counter bumped by every stock change; caches of tool results key on it."""
+        return self._version
+
+    def _init_locks(self, lock_stripes):
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._version_lock = threading.Lock()
+        self._version = 0
+        # Built on the first low-stock query, then kept current by the writes
+        self._low_stock_index = None
+        self._low_stock_lock = threading.Lock()
+
+    def _bump_version(self):
+        """Advance the version counter."""
+        with self._version_lock:
+            self._version += 1
+
+    def _lock_for(self, row):
+        return self._locks[row % len(self._locks)]
+
+    def _locks_for(self, rows):
+        """ExitStack holding every stripe lock for `rows`, acquired in a fixed order to avoid deadlock."""
+        stack = ExitStack()
+        for stripe in sorted({int(row) % len(self._locks) for row in rows}):
+            stack.enter_context(self._locks[stripe])
+        return stack
+
+    def _rebuild_indexes(self):
+        """Rebuild both indexes from the DataFrame, keeping the first row for duplicate keys."""
+        n_rows = len(self._df)
+        # Walk the rows backwards so the first occurrence of a key wins,
+        # matching `matching_items.iloc[0]` in the mask-scan lookup
+        names = self._df['name'].str.lower().tolist()
+        item_ids = self._df['item_id'].tolist()
+        self._name_index = dict(zip(reversed(names), range(n_rows - 1, -1, -1)))
+        self._id_index = dict(zip(reversed(item_ids), range(n_rows - 1, -1, -1)))
+
+    def find_row(self, item_name):
+        """
+        Find the row position of an item by name (case-insensitive).
+
+        Args:
+            item_name (str): The name of the item
+
+        Returns:
+            int: The row position, or -1 if item not found
+        """
+        return self._name_index.get(item_name.lower(), -1)
+
+    def find_row_by_id(self, item_id):
+        """
+        Find the row position of an item by item_id.
+
+        Args:
+            item_id (str): The item_id of the item, e.g. 'SG001'
+
+        Returns:
+            int: The row position, or -1 if item not found
+        """
+        return self._id_index.get(item_id, -1)
+
+    def _quantity_at(self, row):
+        return self._quantities[row]
+
+    def _write_quantity(self, row, value):
+        old_value = self._quantities[row]
+        self._quantities[row] = value
+        self._update_low_stock_index([row], [old_value], [value])
+        self._bump_version()
+
+    def _quantities_at(self, rows):
+        return self._quantities[rows]
+
+    def _write_quantities(self, rows, values):
+        old_values = self._quantities[rows]
+        self._quantities[rows] = values
+        self._update_low_stock_index(rows, old_values, self._quantities[rows])
+        self._bump_version()
+
+    def _update_low_stock_index(self, rows, old_values, new_values):
+        if self._low_stock_index is None:
+            return
+        with self._low_stock_lock:
+            for row, old_value, new_value in zip(rows, old_values, new_values):
+                self._low_stock_index.move(int(row), int(old_value), int(new_value))
+
+    def _names_at(self, rows):
+        return self._df['name'].take(rows).tolist()
+
+    def low_stock(self, threshold=None, k=None):
+        """
+        Items below a stock threshold and/or the k lowest-stock items, lowest first.
+
+        The first call indexes every row by stock level (see LowStockIndex); after
+        that each stock change updates the index, and queries do not scan.
+
+        Args:
+            threshold (int): Only items with fewer than this many units in stock
+            k (int): At most this many items
+
+        Returns:
+            list: (item name, quantity in stock) tuples
+        """
+        if threshold is None and k is None:
+            raise ValueError("Pass a threshold, k, or both")
+        if self._low_stock_index is None:
+            # Writers hold their stripe lock, so none can slip in during the build
+            with self._locks_for(range(len(self._locks))), self._low_stock_lock:
+                if self._low_stock_index is None:
+                    self._low_stock_index = LowStockIndex(self._quantities)
+        with self._low_stock_lock:
+            found = self._low_stock_index.lowest(threshold, k)
+        names = self._names_at([row for row, _ in found])
+        return [(name, quantity) for name, (_, quantity) in zip(names, found)]
+
+    def item_names(self):
+        """
+        Returns:
+            list: A list of all item names in the inventory
+        """
+        return self._df['name'].tolist()
+
+    def get_quantity(self, item_name):
+        """
+        Look up the quantity in stock for an item by name (case-insensitive).
+
+        Returns:
+            int: The quantity in stock, or -1 if item not found
+        """
+        row = self.find_row(item_name)
+        if row < 0:
+            return -1
+        return self._quantity_at(row)
+
+    def adjust_quantity(self, item_name, delta):
+        """
+        Add `delta` to an item's stock, never letting it go below 0.
+
+        Args:
+            item_name (str): The name of the item (case-insensitive)
+            delta (int): Signed change in stock (negative for sales)
+
+        Returns:
+            bool: True if the item was found and updated, False otherwise
+
+        Raises:
+            TypeError: If delta is not a whole number, e.g. 2.5
+        """
+        delta = _whole_units(delta)
+        row = self.find_row(item_name)
+        if row < 0:
+            return False
+        with self._lock_for(row):
+            self._write_quantity(row, max(self._quantity_at(row) + delta, 0))
+        return True
+
+    def sell_if_available(self, item_name, quantity):
+        """
+        Atomically take `quantity` units out of stock only if that many are available.
+
+        Args:
+            item_name (str): The name of the item (case-insensitive)
+            quantity (int): Units to sell
+
+        Returns:
+            bool: True if the stock was decremented, False if item not found or short
+
+        Raises:
+            TypeError: If quantity is not a whole number
+        """
+        quantity = _whole_units(quantity)
+        row = self.find_row(item_name)
+        if row < 0:
+            return False
+        with self._lock_for(row):
+            available = self._quantity_at(row)
+            if available < quantity:
+                return False
+            self._write_quantity(row, available - quantity)
+        return True
+
+    def adjust_quantities(self, rows, deltas, floors):
+        """
+        Apply net stock changes to many rows in one vectorized write.
+
+        Args:
+            rows (np.ndarray): Row positions, as returned by find_row()
+            deltas (np.ndarray): Net signed change for each row
+            floors (np.ndarray): Lowest quantity each row may end at (at least 0)
+
+        Raises:
+            TypeError: If a delta is not a whole number
+        """
+        deltas = np.asarray(deltas)
+        if deltas.dtype.kind == 'f':
+            if (deltas % 1 != 0).any():
+                raise TypeError("Invalid stock change: stock is counted in whole units")
+            deltas = deltas.astype(np.int64)
+        with self._locks_for(rows):
+            current = self._quantities_at(rows)
+            self._write_quantities(rows, np.maximum(current + deltas, floors))
+
+    def add_item(self, name, item_id, description, quantity_in_stock, price):
+        """
+        Append a new item to the inventory and index it.
+
+        Returns:
+            int: The row position of the new item
+        """
+        with self._locks_for(range(len(self._locks))):
+            row = len(self._df)
+            new_row = pd.DataFrame(
+                [[name, item_id, description, quantity_in_stock, price]],
+                columns=INVENTORY_COLUMNS,
+                index=[row],
+            )
+            new_row = new_row[self._df.columns]
+            # Extend categorical columns (see compact_inventory) so concat keeps them categorical
+            for column in self._df.columns:
+                dtype, value = self._df[column].dtype, new_row[column].iloc[0]
+                if isinstance(dtype, pd.CategoricalDtype) and value not in dtype.categories:
+                    self._df[column] = self._df[column].cat.add_categories([value])
+            categorical = {
+                column: dtype for column, dtype in self._df.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)
+            }
+            self._df = pd.concat([self._df, new_row.astype(categorical)])
+            self._quantities = np.append(
+                self._quantities, np.array([quantity_in_stock], dtype=self._quantities.dtype)
+            )
+            if self._low_stock_index is not None:
+                with self._low_stock_lock:
+                    self._low_stock_index.add(row, int(quantity_in_stock))
+            self._name_index.setdefault(name.lower(), row)
+            self._id_index.setdefault(item_id, row)
+            self._bump_version()
+        return row
+
+    def rename_item(self, item_name, new_name):
+        """
+        Rename an item and move its name index entry.
+
+        Returns:
+            bool: True if the item was found and renamed, False otherwise
+        """
+        row = self.find_row(item_name)
+        if row < 0:
+            return False
+        names = self._df['name']
+        if isinstance(names.dtype, pd.CategoricalDtype) and new_name not in names.cat.categories:
+            self._df['name'] = names.cat.add_categories([new_name])
+        self._df.iat[row, self._df.columns.get_loc('name')] = new_name
+        # Another row may share the old name, so rebuild rather than just pop the key
+        self._rebuild_indexes()
+        self._bump_version()
+        return True
+
+    def to_dataframe(self):
+        """
+        Returns:
+            pd.DataFrame: A copy of the current inventory
+        """
+        return self._df.assign(quantity_in_stock=self._quantities.copy())
+
+    def fork(self):
+        """
+        Copy-on-write view of this store for dry runs and rollback.
+
+        Returns:
+            InventoryFork: A fork whose changes stay private until commit()
+        """
+        return InventoryFork(self)
+
+
+class ForkConflictError(RuntimeError):
+    """Raised when committing a fork whose rows were changed in the parent after the fork read them."""
+
+
+class InventoryFork(InventoryStore):
+    """
+    Copy-on-write fork of an inventory store.
+
+    Reads fall through to the parent; writes are kept in a small row -> quantity
+    overlay, so forking is O(1) and commit() or discard() cost time proportional
+    to the rows touched, not the catalog size. Use it to dry-run a plan and then
+    commit or drop its stock changes.
+    """
+
+    def __init__(self, parent, lock_stripes=16):
+        """
+        Args:
+            parent (InventoryStore): Store (or another fork) to fork from
+            lock_stripes (int): Number of locks shared out across the rows
+        """
+        self.parent = parent
+        self._changes = {}
+        # Parent quantity of each changed row when the fork first wrote it
+        self._base = {}
+        self._init_locks(lock_stripes)
+
+    def __len__(self):
+        return len(self.parent)
+
+    def __repr__(self):
+        return f"InventoryFork({self.parent!r}, {len(self._changes)} rows changed)"
+
+    @property
+    def version(self):
+        """(parent version, own version): reads fall through, so parent writes change a fork too."""
+        return (self.parent.version, self._version)
+
+    def find_row(self, item_name):
+        return self.parent.find_row(item_name)
+
+    def find_row_by_id(self, item_id):
+        return self.parent.find_row_by_id(item_id)
+
+    def item_names(self):
+        return self.parent.item_names()
+
+    def _names_at(self, rows):
+        return self.parent._names_at(rows)
+
+    def low_stock(self, threshold=None, k=None):
+        # The parent's index does not know the overlay, so a fork scans its current view
+        if threshold is None and k is None:
+            raise ValueError("Pass a threshold, k, or both")
+        quantities = np.array(self.parent._quantities_at(np.arange(len(self))))
+        for row, value in self._changes.items():
+            quantities[row] = value
+        rows = np.argsort(quantities, kind='stable')
+        if threshold is not None:
+            rows = rows[quantities[rows] < threshold]
+        if k is not None:
+            rows = rows[:k]
+        return list(zip(self._names_at(rows), quantities[rows].tolist()))
+
+    def _quantity_at(self, row):
+        if row in self._changes:
+            return self._changes[row]
+        return self.parent._quantity_at(row)
+
+    def _write_quantity(self, row, value):
+        if row not in self._base:
+            self._base[row] = self.parent._quantity_at(row)
+        self._changes[row] = value
+        self._bump_version()
+
+    def _quantities_at(self, rows):
+        quantities = np.array(self.parent._quantities_at(rows))
+        for i, row in enumerate(rows):
+            if row in self._changes:
+                quantities[i] = self._changes[row]
+        return quantities
+
+    def _write_quantities(self, rows, values):
+        for row, value in zip(rows, values):
+            row = int(row)
+            if row not in self._base:
+                self._base[row] = self.parent._quantity_at(row)
+            self._changes[row] = value
+        self._bump_version()
+
+    def add_item(self, name, item_id, description, quantity_in_stock, price):
+        raise TypeError("Add items to the parent store, not a fork")
+
+    def rename_item(self, item_name, new_name):
+        raise TypeError("Rename items in the parent store, not a fork")
+
+    def changed_rows(self):
+        """
+        Returns:
+            dict: row position -> quantity in stock for every row this fork changed
+        """
+        return dict(self._changes)
+
+    def to_dataframe(self):
+        df = self.parent.to_dataframe()
+        if self._changes:
+            rows = list(self._changes)
+            df.iloc[rows, df.columns.get_loc('quantity_in_stock')] = list(self._changes.values())
+        return df
+
+    def commit(self, force=False):
+        """
+        Write this fork's changes into the parent and reset the fork.
+
+        Args:
+            force (bool): Overwrite rows the parent changed after the fork read them
+
+        Returns:
+            int: Number of rows written
+
+        Raises:
+            ForkConflictError: If a changed row was also changed in the parent since
+                the fork first wrote it (unless force=True)
+        """
+        rows = list(self._changes)
+        if not rows:
+            return 0
+
+        with self.parent._locks_for(rows):
+            if not force:
+                conflicts = [row for row in rows if self.parent._quantity_at(row) != self._base[row]]
+                if conflicts:
+                    raise ForkConflictError(f"Rows changed in the parent since the fork wrote them: {conflicts}")
+            self.parent._write_quantities(np.array(rows), np.array(list(self._changes.values())))
+
+        self.discard()
+        return len(rows)
+
+    def discard(self):
+        """
+        Drop this fork's changes, leaving the parent untouched.
+
+        Returns:
+            int: Number of rows rolled back
+        """
+        n_rows = len(self._changes)
+        self._changes.clear()
+        self._base.clear()
+        self._bump_version()
+        return n_rows
+
+
+def get_inventory_version(df):
+    """
+    Version counter of an inventory, bumped by every stock change made through the tools.
+
+    InventoryStore tracks it itself (a fork returns a tuple that includes its
+    parent's version); a plain DataFrame keeps it in
+    df.attrs['inventory_version'], which update_stock() maintains. Edits made to a
+    DataFrame directly, bypassing the tools, are not counted.
+    """
+    if isinstance(df, InventoryStore):
+        return df.version
+    return df.attrs.get('inventory_version', 0)
+
+
+def bump_inventory_version(df):
+    """Mark a plain inventory DataFrame as changed (stores bump their own version)."""
+    if not isinstance(df, InventoryStore):
+        df.attrs['inventory_version'] = df.attrs.get('inventory_version', 0) + 1
+
+
+MMAP_NUMERIC_COLUMNS = ['quantity_in_stock', 'price']
+MMAP_STRING_COLUMNS = ['name', 'item_id', 'description']
+
+
+def _hash_keys(keys):
+    """Stable 64-bit hashes of string keys (same value in every process)."""
+    return pd.util.hash_array(np.asarray(keys, dtype=object), categorize=False)
+
+
+def _write_string_heap(directory, column, values):
+    """Write strings as one UTF-8 heap plus an offsets array with len(values) + 1 entries."""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{column}.heap"), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(directory, f"{column}.offsets.npy"), offsets)
+
+
+def _write_hash_index(directory, column, keys):
+    """Write key hashes sorted for binary search, with the row each came from."""
+    hashes = _hash_keys(keys)
+    # A stable sort keeps equal hashes in row order, so the first row wins
+    order = np.argsort(hashes, kind='stable')
+    np.save(os.path.join(directory, f"{column}.hash.npy"), hashes[order])
+    np.save(os.path.join(directory, f"{column}.hash_rows.npy"), order.astype(np.int64))
+
+
+class MmapInventoryStore(InventoryStore):
+    """
+    Persistent inventory backed by memory-mapped files in a directory.
+
+    Files:
+        quantity_in_stock.npy, price.npy: Fixed-width columns, memory-mapped
+        <column>.heap + <column>.offsets.npy: UTF-8 string heaps for name, item_id, description
+        name.hash.npy, item_id.hash.npy (+ _rows): Sorted key hashes for O(log n) lookups
+
+    Opening only maps the files; nothing is rebuilt. Stock changes are written
+    straight into quantity_in_stock.npy, so they survive a restart.
+    """
+
+    def __init__(self, directory, lock_stripes=64):
+        """
+        Args:
+            directory (str): Directory written by MmapInventoryStore.create()
+            lock_stripes (int): Number of locks shared out across the rows
+        """
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+
+        self._columns = {
+            column: np.load(os.path.join(directory, f"{column}.npy"), mmap_mode='r+')
+            for column in MMAP_NUMERIC_COLUMNS
+        }
+        self._quantities = self._columns['quantity_in_stock']
+        self._heaps = {column: self._open_heap(column) for column in MMAP_STRING_COLUMNS}
+        self._hash_indexes = {
+            column: (
+                np.load(os.path.join(directory, f"{column}.hash.npy"), mmap_mode='r'),
+                np.load(os.path.join(directory, f"{column}.hash_rows.npy"), mmap_mode='r'),
+            )
+            for column in ('name', 'item_id')
+        }
+        self._init_locks(lock_stripes)
+
+    def _open_heap(self, column):
+        offsets = np.load(os.path.join(self.directory, f"{column}.offsets.npy"), mmap_mode='r')
+        heap_path = os.path.join(self.directory, f"{column}.heap")
+        # np.memmap refuses empty files, which an all-empty column produces
+        if os.path.getsize(heap_path) == 0:
+            return np.zeros(0, dtype=np.uint8), offsets
+        return np.memmap(heap_path, dtype=np.uint8, mode='r'), offsets
+
+    @classmethod
+    def create(cls, directory, df):
+        """
+        Write an inventory DataFrame to `directory` and open it as a store.
+
+        Args:
+            directory (str): Target directory, created if missing
+            df (pd.DataFrame): Inventory with the create_inventory_dataframe() columns
+
+        Returns:
+            MmapInventoryStore: The opened store
+        """
+        os.makedirs(directory, exist_ok=True)
+        for column in MMAP_NUMERIC_COLUMNS:
+            np.save(os.path.join(directory, f"{column}.npy"), df[column].to_numpy())
+        for column in MMAP_STRING_COLUMNS:
+            _write_string_heap(directory, column, df[column].astype(str).tolist())
+
+        _write_hash_index(directory, 'name', df['name'].str.lower().tolist())
+        _write_hash_index(directory, 'item_id', df['item_id'].astype(str).tolist())
+
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump({'n_items': len(df), 'columns': list(df.columns)}, f)
+        return cls(directory)
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __repr__(self):
+        return f"MmapInventoryStore({self.directory!r}, {len(self)} items)"
+
+    def _string_at(self, column, row):
+        heap, offsets = self._heaps[column]
+        return heap[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+
+    def _strings(self, column):
+        heap, offsets = self._heaps[column]
+        blob = heap.tobytes()
+        bounds = offsets.tolist()
+        return [blob[start:end].decode('utf-8') for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def _lookup(self, column, key, normalize):
+        hashes, rows = self._hash_indexes[column]
+        key_hash = _hash_keys([key])[0]
+        position = int(np.searchsorted(hashes, key_hash))
+        # Walk every entry with this hash to rule out collisions
+        while position < len(hashes) and hashes[position] == key_hash:
+            row = int(rows[position])
+            if normalize(self._string_at(column, row)) == key:
+                return row
+            position += 1
+        return -1
+
+    def find_row(self, item_name):
+        return self._lookup('name', item_name.lower(), str.lower)
+
+    def find_row_by_id(self, item_id):
+        return self._lookup('item_id', item_id, str)
+
+    def item_names(self):
+        return self._strings('name')
+
+    def _names_at(self, rows):
+        return [self._string_at('name', row) for row in rows]
+
+    def add_item(self, name, item_id, description, quantity_in_stock, price):
+        raise TypeError("MmapInventoryStore has a fixed set of items; rebuild it with create()")
+
+    def rename_item(self, item_name, new_name):
+        raise TypeError("MmapInventoryStore has a fixed set of items; rebuild it with create()")
+
+    def flush(self):
+        """Flush in-place stock changes to disk."""
+        self._quantities.flush()
+
+    def to_dataframe(self):
+        data = {column: self._strings(column) for column in MMAP_STRING_COLUMNS}
+        for column in MMAP_NUMERIC_COLUMNS:
+            data[column] = np.array(self._columns[column])
+        return pd.DataFrame(data, columns=self.meta['columns'])
@@ -1,16 +1,58 @@
 import copy
 import json
+import numbers
+import os
 import random
+import time
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
 import pandas as pd
 
 from datetime import datetime
 
+from inventory_schema import compact_inventory, compact_ledger
+from inventory_store import InventoryStore, MmapInventoryStore, bump_inventory_version
+from ledger_utils import SalesLedger, TransactionLog
+from name_resolver import ItemNameResolver, resolve_plan_item_names
+from plan_utils import (
+    REFLECTION_POLICIES,
+    ExecutionHistoryFormatter,
+    PlanValidationError,
+    StreamingPlanParser,
+    compile_plan,
+    expand_results,
+    format_history_record,
+    is_read_only_step,
+    optimize_plan,
+    plan_dependencies,
+    reflection_triggers,
+)
+
+
+TRANSACTION_COLUMNS = ['item_name', 'transaction_type', 'quantity']
+
+# Default reorder threshold for get_low_stock_items()
+LOW_STOCK_THRESHOLD = 5
 
-def create_inventory_dataframe():
+# Common style names for the sunglasses in create_inventory_dataframe()
+SUNGLASSES_ALIASES = {
+    'cat-eye': 'Mystique',
+    'pilot': 'Aviator',
+    'teardrop': 'Aviator',
+    'wraparound': 'Sport',
+}
+
+
+def create_inventory_dataframe(compact=False):
    """
    Create an initial pandas DataFrame containing sunglasses inventory.
    
+   Args:
+       compact (bool): Use the compact dtypes of inventory_schema.compact_inventory()
+                       (categorical or Arrow string text, int32 stock)
+   
    Returns:
        pd.DataFrame: A DataFrame with columns for name, item_id, description, 
                     quantity_in_stock, and price for 5 different sunglasses styles.
@@ -44,7 +86,26 @@ def create_inventory_dataframe():
    }
    
    # Create and return the DataFrame
-   return pd.DataFrame(sunglasses_data)
+   df = pd.DataFrame(sunglasses_data)
+   return compact_inventory(df) if compact else df
+
+def open_persistent_inventory(directory):
+   """
+   Open the memory-mapped inventory in `directory`, creating it on first use.
+   
+   The first call writes create_inventory_dataframe() to disk. Later calls (including
+   after a kernel or app restart) open the saved files, so stock changes made with
+   update_stock() are kept.
+   
+   Args:
+       directory (str): Directory holding the inventory files
+   
+   Returns:
+       MmapInventoryStore: Store usable anywhere the inventory DataFrame is
+   """
+   if os.path.exists(os.path.join(directory, 'meta.json')):
+       return MmapInventoryStore(directory)
+   return MmapInventoryStore.create(directory, create_inventory_dataframe())
 
 import pandas as pd
 from datetime import datetime
@@ -74,6 +135,33 @@ def create_transaction_dataframe(opening_balance=500.00):
     # Create and return the DataFrame
     return pd.DataFrame(opening_transaction)
 
+def create_transaction_log(directory, opening_balance=500.00, opening_inventory=None, snapshot_every=1000,
+                           opening_timestamp=None):
+    """
+    Open (or create) an event-sourced transaction log for the cash register.
+    
+    Unlike create_transaction_dataframe(), the balance is not stored per row: each
+    transaction is appended to a file in `directory` and periodic snapshots of the
+    balance and inventory keep restarts and point-in-time queries short.
+    
+    Args:
+        directory (str): Directory for the log files
+        opening_balance (float): Starting cash register balance for a new log. Defaults to $500.00.
+        opening_inventory (dict): Optional item_id -> quantity in stock for a new log
+        snapshot_every (int): Number of transactions between snapshots
+        opening_timestamp: When a new log opens, defaults to now; set it to backfill earlier transactions
+    
+    Returns:
+        TransactionLog: Use .record(...) to add transactions and .balance for the current balance
+    """
+    return TransactionLog(
+        directory,
+        opening_balance=opening_balance,
+        opening_inventory=opening_inventory,
+        snapshot_every=snapshot_every,
+        opening_timestamp=opening_timestamp,
+    )
+
 # Example usage:
 if __name__ == "__main__":
     # Initialize the transaction tracker
@@ -82,15 +170,54 @@ if __name__ == "__main__":
     print(transaction_df)
     print(f"\nCurrent register balance: ${transaction_df['balance_after_transaction'].iloc[-1]:.2f}")
 
-def create_ledger_dataframe():
+def create_ledger_dataframe(compact=False):
    """
    Create an empty pandas DataFrame to serve as a sales ledger.
    
+   Args:
+       compact (bool): Start with the typed columns of inventory_schema.LEDGER_SCHEMA.
+                       Appending rows with .loc resets them to default dtypes, so
+                       for a ledger grown row by row use create_ledger() instead
+   
    Returns:
        pd.DataFrame: Empty DataFrame with columns for transaction_date, 
                     item_id, quantity, and transaction_type
    """
-   return pd.DataFrame(columns=['transaction_date', 'item_id', 'quantity', 'transaction_type'])
+   df = pd.DataFrame(columns=['transaction_date', 'item_id', 'quantity', 'transaction_type'])
+   return compact_ledger(df) if compact else df
+
+def create_ledger():
+   """
+   Create an empty columnar sales ledger.
+   
+   Use this instead of create_ledger_dataframe() when the ledger is grown one row at a
+   time: appends go to typed array buffers and the DataFrame is only built by
+   ledger.to_dataframe().
+   
+   Returns:
+       SalesLedger: Empty ledger with the same columns as create_ledger_dataframe()
+   """
+   return SalesLedger()
+
+def create_name_resolver(df, aliases=SUNGLASSES_ALIASES):
+   """
+   Build a local resolver that maps near-miss item references to inventory names.
+   
+   Pass it as name_resolver to execute_plan() or execute_plan_with_reflection() to
+   correct item_name arguments before each step runs, instead of spending a
+   reflection LLM call on a "not found" result. Only close matches (plurals, small
+   typos) are rewritten, so an item the store does not carry is still reported as
+   not found rather than checked or sold as another SKU; the reflection prompt
+   then lists the closest names.
+   
+   Args:
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+       aliases (dict): Alias -> canonical item name
+   
+   Returns:
+       ItemNameResolver: e.g. resolver.resolve('aviators') -> 'Aviator'
+   """
+   return ItemNameResolver.from_inventory(df, aliases=aliases)
 
 def get_formatted_item_names(df):
    """
@@ -101,11 +228,14 @@ def get_formatted_item_names(df):
    and update_stock().
    
    Args:
-       df (pd.DataFrame): The inventory DataFrame
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
    
    Returns:
        list: A list of all item names in the inventory
    """
+   if isinstance(df, InventoryStore):
+       return df.item_names()
+   
    return df['name'].tolist()
 
 def check_inventory_by_name(df, item_name):
@@ -113,12 +243,16 @@ def check_inventory_by_name(df, item_name):
    Check if an item is in stock by searching for it by name.
    
    Args:
-       df (pd.DataFrame): The inventory DataFrame
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
        item_name (str): The name of the item to check (case-insensitive)
    
    Returns:
        int: The quantity in stock, or -1 if item not found
    """
+   # Indexed stores answer in O(1) without scanning the name column
+   if isinstance(df, InventoryStore):
+       return df.get_quantity(item_name)
+   
    # Convert search term to lowercase for case-insensitive matching
    item_name_lower = item_name.lower()
    
@@ -131,12 +265,45 @@ def check_inventory_by_name(df, item_name):
    # Get the quantity from the first matching item
    return matching_items.iloc[0]['quantity_in_stock']
 
+def get_low_stock_items(df, threshold=LOW_STOCK_THRESHOLD, k=None):
+   """
+   List items that are running low, lowest stock first.
+   
+   Use this to find items below a reorder threshold, or the k items with the least stock.
+   
+   Args:
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+       threshold (int): Only items with fewer than this many units in stock
+                        (None to rank every item, together with k)
+       k (int): Return at most this many items
+   
+   Returns:
+       list: Dictionaries with 'name' and 'quantity_in_stock' keys. When k cuts off
+             items tied at the same stock level, which of them are listed may differ
+             between a DataFrame and a store.
+   """
+   # Stores keep a low-stock index current on every update, so this does not scan
+   if isinstance(df, InventoryStore):
+       found = df.low_stock(threshold, k)
+   else:
+       if threshold is None and k is None:
+           raise ValueError("Pass a threshold, k, or both")
+       stock = df['quantity_in_stock']
+       if threshold is not None:
+           stock = stock[stock < threshold]
+       stock = stock.sort_values(kind='stable')
+       if k is not None:
+           stock = stock.iloc[:k]
+       found = zip(df.loc[stock.index, 'name'], stock)
+   
+   return [{'name': name, 'quantity_in_stock': int(quantity)} for name, quantity in found]
+
 def update_stock(df, item_name, transaction_type, quantity):
    """
    Update the stock quantity for an item based on a transaction.
    
    Args:
-       df (pd.DataFrame): The inventory DataFrame
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
        item_name (str): The name of the item to update (case-insensitive)
        transaction_type (str): Either 'sale' or 'return'
        quantity (int): The quantity to add or subtract (must be > 0)
@@ -151,6 +318,10 @@ def update_stock(df, item_name, transaction_type, quantity):
    if transaction_type.lower() not in ['sale', 'return']:
        return False
    
+   if isinstance(df, InventoryStore):
+       delta = -quantity if transaction_type.lower() == 'sale' else quantity
+       return df.adjust_quantity(item_name, delta)
+   
    # Convert search term to lowercase for case-insensitive matching
    item_name_lower = item_name.lower()
    
@@ -168,9 +339,137 @@ def update_stock(df, item_name, transaction_type, quantity):
    
    # Ensure quantity doesn't go below 0
    df.loc[item_mask, 'quantity_in_stock'] = df.loc[item_mask, 'quantity_in_stock'].clip(lower=0)
+   bump_inventory_version(df)
    
    return True
 
+def sell_if_in_stock(df, item_name, quantity):
+   """
+   Sell an item only if enough units are in stock.
+   
+   On an InventoryStore the check and the decrement happen atomically, so two agents
+   selling the last units at the same time cannot both succeed.
+   
+   Args:
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+       item_name (str): The name of the item to sell (case-insensitive)
+       quantity (int): The quantity to sell (must be > 0)
+   
+   Returns:
+       bool: True if the sale was made, False if item not found, short on stock or invalid input
+   """
+   if quantity <= 0:
+       return False
+   
+   if isinstance(df, InventoryStore):
+       return df.sell_if_available(item_name, quantity)
+   
+   if check_inventory_by_name(df, item_name) < quantity:
+       return False
+   return update_stock(df, item_name, 'sale', quantity)
+
+def update_stock_bulk(df, transactions):
+   """
+   Apply a batch of sales and returns to the inventory in one vectorized write.
+   
+   Each transaction is validated the same way as update_stock(): transactions that
+   update_stock() would reject with False are skipped, and input it would raise on
+   (a string quantity, a missing transaction type or item name) raises the same error
+   here, before anything is written. Valid transactions
+   are netted per item with a groupby and written in a single update. Stock is
+   floored at 0 as if the transactions had been applied one by one in order, so the
+   final quantities match calling update_stock() for every row.
+   
+   Args:
+       df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+       transactions (list | pd.DataFrame): (item_name, transaction_type, quantity) tuples,
+                                           dicts with those keys, or a DataFrame with those columns
+   
+   Returns:
+       np.ndarray: Boolean array with one entry per transaction, True if it was applied
+   """
+   txns = _as_transaction_frame(transactions)
+   if txns.empty:
+       return np.zeros(0, dtype=bool)
+   
+   # Same checks as update_stock: positive quantity, known type, existing item.
+   # Non-numbers are not coerced; .str.lower() gives NaN for non-strings.
+   quantities = txns['quantity']
+   numeric = pd.Series(True, index=txns.index)
+   if not pd.api.types.is_numeric_dtype(quantities):
+      numeric = quantities.map(lambda q: isinstance(q, numbers.Number))
+      quantities = quantities.where(numeric).astype('float64')
+   item_keys = txns['item_name'].str.lower()
+   kinds = txns['transaction_type'].str.lower()
+   valid = (quantities > 0) & kinds.isin(['sale', 'return'])
+   
+   # Rows on which update_stock would raise; raise for the first one the same way
+   raises = ~numeric | ((quantities > 0) & kinds.isna()) | (valid & item_keys.isna())
+   if raises.any():
+      _check_transaction(*txns.loc[raises.idxmax(), TRANSACTION_COLUMNS])
+   
+   if isinstance(df, InventoryStore):
+       rows = pd.Series(
+           [df.find_row(key) if isinstance(key, str) else -1 for key in item_keys],
+           index=txns.index,
+       )
+       found = rows >= 0
+       group_keys = rows
+   else:
+       inventory_keys = df['name'].str.lower()
+       found = item_keys.isin(inventory_keys)
+       group_keys = item_keys
+   
+   success = (valid & found).to_numpy()
+   if not success.any():
+       return success
+   
+   deltas = quantities.where(kinds == 'return', -quantities)[success]
+   if (deltas % 1 == 0).all():
+       deltas = deltas.astype('int64')
+   group_keys = group_keys[success]
+   
+   # Applying deltas d1..dn one at a time with a floor of 0 ends at
+   # max(q0 + net, net - min prefix sum), which only needs two groupby passes
+   net = deltas.groupby(group_keys, sort=False).sum()
+   min_prefix = deltas.groupby(group_keys, sort=False).cumsum().groupby(group_keys, sort=False).min()
+   floor = net - min_prefix
+   
+   if isinstance(df, InventoryStore):
+       df.adjust_quantities(net.index.to_numpy(), net.to_numpy(), floor.to_numpy())
+   else:
+       # update_stock touches every row with a matching name, so do the same here
+       item_mask = inventory_keys.isin(net.index)
+       target_keys = inventory_keys[item_mask]
+       current = df.loc[item_mask, 'quantity_in_stock']
+       updated = np.maximum(current + target_keys.map(net), target_keys.map(floor)).to_numpy()
+       # Keep a compact int32 stock column at its width
+       if updated.dtype.kind == current.dtype.kind:
+           updated = updated.astype(current.dtype, copy=False)
+       df.loc[item_mask, 'quantity_in_stock'] = updated
+       bump_inventory_version(df)
+   
+   return success
+
+def _check_transaction(item_name, transaction_type, quantity):
+   """update_stock()'s input checks for one transaction: False if rejected, and the same errors."""
+   if quantity <= 0:
+      return False
+   if transaction_type.lower() not in ['sale', 'return']:
+      return False
+   item_name.lower()
+   return True
+
+def _as_transaction_frame(transactions):
+   """Normalize a list of transaction tuples/dicts or a DataFrame to a DataFrame."""
+   if isinstance(transactions, pd.DataFrame):
+       return transactions.reset_index(drop=True)
+   
+   records = list(transactions)
+   if records and isinstance(records[0], dict):
+       return pd.DataFrame.from_records(records, columns=TRANSACTION_COLUMNS)
+   return pd.DataFrame(records, columns=TRANSACTION_COLUMNS)
+
 def execute_step(step, inventory_df, available_functions):
     """
     Execute a single step of a plan.
@@ -196,7 +495,7 @@ def execute_step(step, inventory_df, available_functions):
     
     return result
 
-def execute_plan(plan, inventory_df, available_functions):
+def execute_plan(plan, inventory_df, available_functions, name_resolver=None):
     """
     Execute a plan by running each task sequentially.
     
@@ -204,10 +503,15 @@ def execute_plan(plan, inventory_df, available_functions):
         plan (list): List of task dictionaries with 'task' and 'args' keys
         inventory_df (pd.DataFrame): The inventory DataFrame
         available_functions (dict): Dictionary mapping function names to function objects
+        name_resolver (ItemNameResolver): Optional resolver that corrects near-miss
+                                          item_name arguments first (see create_name_resolver)
     
     Returns:
         list: Results from each executed task
     """
+    if name_resolver is not None:
+        plan, _ = _resolve_item_names(plan, name_resolver)
+    
     results = []
     
     for step in plan:
@@ -217,6 +521,147 @@ def execute_plan(plan, inventory_df, available_functions):
     
     return results
 
+def dry_run_plan(plan, inventory_store, available_functions):
+    """
+    Run a plan against a copy-on-write fork so the real inventory is not touched.
+    
+    Inspect the fork (e.g. fork.changed_rows() or check_inventory_by_name(fork, ...)),
+    then call fork.commit() to keep the stock changes or fork.discard() to drop them.
+    
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+        inventory_store (InventoryStore): The inventory store
+        available_functions (dict): Dictionary mapping function names to function objects
+    
+    Returns:
+        tuple: (results, fork)
+    """
+    fork = inventory_store.fork()
+    results = execute_plan(plan, fork, available_functions)
+    return results, fork
+
+def execute_optimized_plan(plan, inventory_df, available_functions):
+    """
+    Run a plan after removing redundant inventory steps with optimize_plan().
+    
+    Duplicate checks between writes are reused, name-list lookups run once and
+    adjacent same-item stock updates are merged where that is exact, so the
+    returned results match execute_plan() on the original plan.
+    
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+        inventory_df (pd.DataFrame): The inventory DataFrame
+        available_functions (dict): Dictionary mapping function names to function objects
+    
+    Returns:
+        list: Results for each step of the original plan
+    """
+    optimized = optimize_plan(plan)
+    print(f"Optimized plan: removed {optimized.steps_removed} of {len(plan)} steps")
+    
+    results = execute_plan(optimized.plan, inventory_df, available_functions)
+    return expand_results(optimized, results)
+
+def execute_compiled_plan(compiled_plan):
+    """
+    Execute a plan already checked and bound by compile_plan().
+    
+    Args:
+        compiled_plan (list): CompiledStep objects from compile_plan()
+    
+    Returns:
+        list: Results from each executed task
+    """
+    results = []
+    
+    for step in compiled_plan:
+        result = step.call()
+        results.append(result)
+        print(f"Executed {step.task['task']}: {result}")
+    
+    return results
+
+# Returned by execute_plan_parallel's workers for a step after a failed one
+_SKIPPED = object()
+
+def execute_plan_parallel(plan, inventory_df, available_functions, max_workers=8):
+    """
+    Execute a plan, running steps that do not depend on each other at the same time.
+    
+    Dependencies come from plan_dependencies(): a step waits only for earlier steps
+    that write something it reads or writes. Results are returned in plan order and
+    the "Executed ..." log is printed in plan order, exactly as execute_plan() does.
+    
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+        inventory_df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+        available_functions (dict): Dictionary mapping function names to function objects
+        max_workers (int): Maximum number of steps running at once
+    
+    Returns:
+        list: Results from each executed task
+    
+    Raises:
+        Exception: The error of the first failing step, after every step before it
+                   has run and been logged. As in execute_plan(), later steps do not
+                   run: queued ones are cancelled and ones not yet started are
+                   skipped. Later steps that had already started before the
+                   failure (they are independent of the failing step) still
+                   complete, and their changes are kept.
+    """
+    # Only the store is safe to write while other threads read it
+    dependencies = plan_dependencies(plan, fine_grained=isinstance(inventory_df, InventoryStore))
+    
+    results = [None] * len(plan)
+    errors = {}
+    finished = set()
+    waiting = list(range(len(plan)))
+    running = {}
+    next_to_log = 0
+    # Position of the first failed step; workers skip any step after it
+    first_failure = [len(plan)]
+    
+    def run_step(i):
+        if i > first_failure[0]:
+            return _SKIPPED
+        return execute_step(plan[i], inventory_df, available_functions)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while waiting or running:
+            # After a failure only the steps before it are still started
+            ready = [i for i in waiting if i < first_failure[0] and dependencies[i] <= finished]
+            for i in ready:
+                waiting.remove(i)
+                running[pool.submit(run_step, i)] = i
+            if not running:
+                break
+            
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors[i] = e
+                    first_failure[0] = min(first_failure[0], i)
+                    for pending, j in list(running.items()):
+                        if j > i and pending.cancel():
+                            del running[pending]
+                    continue
+                if result is not _SKIPPED:
+                    results[i] = result
+                    finished.add(i)
+            
+            # Log in plan order, holding back steps that finished early
+            while next_to_log in finished:
+                print(f"Executed {plan[next_to_log]['task']}: {results[next_to_log]}")
+                next_to_log += 1
+    
+    if errors:
+        raise errors[min(errors)]
+    
+    return results
+
 import json
 import copy
 
@@ -228,7 +673,16 @@ def execute_plan_with_reflection(
         initial_plan, 
         available_functions,
         inventory_df, 
-        max_reflections_per_step=2
+        max_reflections_per_step=2,
+        reflection_policy="always",
+        speculate=False,
+        history_token_budget=None,
+        max_result_tokens=None,
+        tool_cache=None,
+        stream_reflection=False,
+        validate_plan=False,
+        rollback_on_failure=False,
+        name_resolver=None
     ):
     """
     Execute a plan with reflection after each step.
@@ -238,96 +692,337 @@ def execute_plan_with_reflection(
         initial_plan: List of task dictionaries
         inventory_df: The inventory DataFrame
         max_reflections_per_step: Max number of reflections allowed per step
+        reflection_policy: "always" reflects after every step that has steps remaining.
+            "adaptive" runs the local reflection_triggers() check first and only calls
+            the LLM when a trigger fires (failed step, item not found, rejected stock
+            update, or a result that contradicts later steps' args).
+        speculate: While a reflection LLM call is in flight, start the next step in the
+            background if it is a read-only inventory tool. Its result is used if the
+            reflection keeps the plan and discarded if the plan changes. Steps with
+            side effects are never started early.
+        history_token_budget: Max tokens of execution history in each reflection prompt;
+            older steps beyond it are summarized. None keeps the full history.
+        max_result_tokens: Max tokens shown for any single step result. None keeps
+            results in full.
+        tool_cache: Optional plan_utils.ToolResultCache. Read-only tools are memoized
+            for the run, each record notes whether its tool call was a cache "hit" or
+            "miss", and a final record reports the cache statistics.
+        stream_reflection: Stream reflection responses and parse them as they arrive
+            (see call_llm_for_reflection); token usage is still recorded.
+        validate_plan: Compile the initial plan and every revised plan with compile_plan()
+            before running it. Near-miss task/argument names are repaired locally; an
+            invalid initial plan raises PlanValidationError before any step runs, and an
+            invalid revision is ignored instead of failing mid-plan.
+        rollback_on_failure: Run the plan on a copy-on-write fork of the inventory
+            (which must be an InventoryStore) and commit its stock changes only if
+            no step failed; otherwise they are discarded.
+        name_resolver: Optional ItemNameResolver. Near-miss item_name arguments in the
+            initial plan and every revised plan are replaced with canonical names
+            before they run, and a final record counts the corrections. A name too
+            far off to replace gets the closest item names in its step record
+            ("name_suggestions"), which the reflection prompt shows.
     
     Returns:
-        List of execution records
+        List of execution records. Each step record also carries tool_time_s (tool
+        wall time), reflection_attempts (reflection LLM calls after the step),
+        reflection_latency_s and the prompt_tokens / completion_tokens reported in
+        the responses' usage (None if a response did not report it). With the
+        "adaptive" policy or a tool cache, the last records report reflection calls
+        skipped and cache statistics. See plan_utils.write_execution_records() to
+        export them.
     """
+    if reflection_policy not in REFLECTION_POLICIES:
+        raise ValueError(f"reflection_policy must be one of {REFLECTION_POLICIES}, got {reflection_policy!r}")
+    
+    inventory_fork = None
+    if rollback_on_failure:
+        if not isinstance(inventory_df, InventoryStore):
+            raise ValueError("rollback_on_failure needs an InventoryStore inventory")
+        inventory_fork = inventory_df = inventory_df.fork()
     
     current_plan = copy.deepcopy(initial_plan)
     execution_history = []
+    reflections_skipped = 0
+    reflection_points = 0
+    speculation_pool = ThreadPoolExecutor(max_workers=1) if speculate else None
+    speculation = None
+    history_formatter = ExecutionHistoryFormatter(
+        token_budget=history_token_budget, max_result_tokens=max_result_tokens
+    )
+    if tool_cache is not None:
+        available_functions = tool_cache.wrap(available_functions)
+    
+    names_corrected = 0
+    if name_resolver is not None:
+        current_plan, names_corrected = _resolve_item_names(current_plan, name_resolver)
     
-    while current_plan:
-        # Get next task
-        current_task = current_plan[0]
-        remaining_plan = current_plan[1:]
+    # id(task) -> (task, bound call) for validated steps
+    bound_calls = {}
+    if validate_plan:
+        current_plan = _compile_into(current_plan, inventory_df, available_functions, bound_calls)
+    
+    try:
+        while current_plan:
+            # Get next task
+            current_task = current_plan[0]
+            remaining_plan = current_plan[1:]
         
-        print(f"\n--- Executing: {current_task['task']} ---")
+            print(f"\n--- Executing: {current_task['task']} ---")
         
-        # Execute current task
-        try:
-            function_to_call = available_functions[current_task['task']]
-            
-            # Add inventory_df to args if it's expected
-            args = copy.deepcopy(current_task['args'])
-            if 'df' in args and args['df'] == 'inventory_df':
-                args['df'] = inventory_df
-            
-            result = function_to_call(**args)
-            execution_status = "SUCCESS"
-            print(f"Result: {result}")
-            
-        except Exception as e:
-            result = str(e)
-            execution_status = "FAILED"
-            print(f"Failed: {result}")
+            # Execute current task, or pick up the result started during the last reflection
+            if speculation is not None:
+                result, execution_status, cache_outcome, tool_time = speculation.result()
+                speculation = None
+            else:
+                result, execution_status, cache_outcome, tool_time = _run_plan_task(
+                    current_task, inventory_df, available_functions, tool_cache,
+                    _bound_call_for(current_task, bound_calls)
+                )
+        
+            if execution_status == "SUCCESS":
+                print(f"Result: {result}")
+            else:
+                print(f"Failed: {result}")
+        
+            # Record execution
+            execution_record = {
+                "task": current_task,
+                "result": result,
+                "status": execution_status,
+                "tool_time_s": tool_time,
+                "reflection_attempts": 0,
+                "reflection_latency_s": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+            }
+            if cache_outcome is not None:
+                execution_record["cache"] = cache_outcome
+            if name_resolver is not None and isinstance(current_task.get('args'), dict):
+                # Names too far off to rewrite are left to the LLM, with the closest items as hints
+                suggestions = name_resolver.suggest(current_task['args'].get('item_name'))
+                if suggestions:
+                    execution_record["name_suggestions"] = suggestions
+            execution_history.append(execution_record)
         
-        # Record execution
-        execution_record = {
-            "task": current_task,
-            "result": result,
-            "status": execution_status
-        }
-        execution_history.append(execution_record)
+            # If there are remaining tasks, do reflection
+            should_reflect = bool(remaining_plan)
+            if remaining_plan:
+                reflection_points += 1
         
-        # If there are remaining tasks, do reflection
-        if remaining_plan:
-            print(f"\n--- Reflecting on remaining {len(remaining_plan)} tasks ---")
+            if remaining_plan and reflection_policy == "adaptive":
+                triggers = reflection_triggers(execution_record, remaining_plan)
+                if triggers:
+                    print(f"\n--- Reflection triggered: {'; '.join(triggers)} ---")
+                else:
+                    print("\n--- No reflection triggers fired, skipping reflection ---")
+                    reflections_skipped += 1
+                    should_reflect = False
+        
+            if should_reflect:
+                print(f"\n--- Reflecting on remaining {len(remaining_plan)} tasks ---")
             
-            reflection_count = 0
-            plan_updated = True
+                # Read-only next steps can run while the LLM thinks
+                planned_remaining = remaining_plan
+                if speculate and is_read_only_step(remaining_plan[0]):
+                    speculation = speculation_pool.submit(
+                        _run_plan_task, remaining_plan[0], inventory_df, available_functions, tool_cache,
+                        _bound_call_for(remaining_plan[0], bound_calls)
+                    )
             
-            while plan_updated and reflection_count < max_reflections_per_step:
+                reflection_count = 0
+                plan_updated = True
+            
+                while plan_updated and reflection_count < max_reflections_per_step:
                 
-                # Build reflection prompt
-                reflection_prompt = build_reflection_prompt(
-                    user_query, execution_history, remaining_plan
-                )
+                    # Build reflection prompt
+                    reflection_prompt = build_reflection_prompt(
+                        user_query, execution_history, remaining_plan, history_formatter
+                    )
                 
-                # Get LLM reflection
-                print(f"Reflection attempt {reflection_count + 1}...")
-                llm_response = call_llm_for_reflection(client, context, planning_instruction, reflection_prompt)
+                    # Get LLM reflection
+                    print(f"Reflection attempt {reflection_count + 1}...")
+                    usage = {}
+                    llm_response = call_llm_for_reflection(
+                        client, context, planning_instruction, reflection_prompt,
+                        stream=stream_reflection, usage=usage
+                    )
+                    execution_record["reflection_attempts"] += 1
+                    execution_record["reflection_latency_s"] += usage.get("latency_s", 0.0)
+                    # A count the API did not report makes the step's total unknown (None)
+                    for key in ("prompt_tokens", "completion_tokens"):
+                        if execution_record[key] is not None:
+                            count = usage.get(key)
+                            execution_record[key] = None if count is None else execution_record[key] + count
                 
-                if "NO_CHANGES_NEEDED" in llm_response:
-                    print("No changes needed to plan")
-                    plan_updated = False
-                else:
-                    # Parse new plan from LLM response
-                    new_remaining_plan = extract_plan_from_response(llm_response)
+                    if "NO_CHANGES_NEEDED" in llm_response:
+                        print("No changes needed to plan")
+                        plan_updated = False
+                    else:
+                        # Parse new plan from LLM response
+                        new_remaining_plan = extract_plan_from_response(llm_response)
                     
-                    if new_remaining_plan and new_remaining_plan != remaining_plan:
-                        print(f"Plan updated! New remaining tasks: {len(new_remaining_plan)}")
-                        remaining_plan = new_remaining_plan
-                        reflection_count += 1
+                        if new_remaining_plan and name_resolver is not None:
+                            new_remaining_plan, corrected = _resolve_item_names(new_remaining_plan, name_resolver)
+                            names_corrected += corrected
+                    
+                        if new_remaining_plan and validate_plan:
+                            try:
+                                new_remaining_plan = _compile_into(
+                                    new_remaining_plan, inventory_df, available_functions, bound_calls
+                                )
+                            except PlanValidationError as e:
+                                print(f"Rejected revised plan: {e}")
+                                new_remaining_plan = None
+                    
+                        if new_remaining_plan and new_remaining_plan != remaining_plan:
+                            print(f"Plan updated! New remaining tasks: {len(new_remaining_plan)}")
+                            remaining_plan = new_remaining_plan
+                            reflection_count += 1
                         
-                        # Log the reflection
-                        execution_history.append({
-                            "task": "REFLECTION",
-                            "result": f"Plan updated after step {len(execution_history)}",
-                            "status": "PLAN_REVISION"
-                        })
-                    else:
-                        print("No actual changes made to plan")
-                        plan_updated = False
+                            # Log the reflection
+                            execution_history.append({
+                                "task": "REFLECTION",
+                                "result": f"Plan updated after step {len(execution_history)}",
+                                "status": "PLAN_REVISION"
+                            })
+                        else:
+                            print("No actual changes made to plan")
+                            plan_updated = False
+            
+                if speculation is not None and remaining_plan is not planned_remaining:
+                    # The plan changed, so the early result may not belong to the new next step.
+                    # Let it finish before any write runs alongside it, then drop it.
+                    speculation.result()
+                    speculation = None
+                    print("Discarded speculative result: plan changed")
         
-        # Update current plan for next iteration
-        current_plan = remaining_plan
+            # Update current plan for next iteration
+            current_plan = remaining_plan
+    finally:
+        # Also on an exception from a step or the LLM call, so no worker thread is left behind
+        if speculation_pool is not None:
+            speculation_pool.shutdown(cancel_futures=True)
+    
+    if inventory_fork is not None:
+        if any(record.get("status") == "FAILED" for record in execution_history):
+            print(f"\n--- Plan had failed steps: rolled back {inventory_fork.discard()} changed items ---")
+        else:
+            print(f"\n--- Plan succeeded: committed {inventory_fork.commit()} changed items ---")
+    
+    if reflection_policy != "always":
+        summary = f"Skipped {reflections_skipped} of {reflection_points} reflection LLM calls"
+        print(f"\n--- Reflection policy '{reflection_policy}': {summary} ---")
+        execution_history.append({
+            "task": "REFLECTION_POLICY",
+            "result": summary,
+            "status": "STATS",
+            "reflections_skipped": reflections_skipped,
+        })
+    
+    if tool_cache is not None:
+        cache_stats = tool_cache.stats()
+        summary = (
+            f"{cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+            f"{cache_stats['evictions']} evictions"
+        )
+        print(f"\n--- Tool cache: {summary} ---")
+        execution_history.append({
+            "task": "TOOL_CACHE",
+            "result": summary,
+            "status": "STATS",
+            **cache_stats,
+        })
+    
+    if name_resolver is not None:
+        summary = f"Corrected {names_corrected} item names"
+        print(f"\n--- Name resolver: {summary} ---")
+        execution_history.append({
+            "task": "NAME_RESOLVER",
+            "result": summary,
+            "status": "STATS",
+            "names_corrected": names_corrected,
+        })
     
     return execution_history
 
-def build_reflection_prompt(user_query, execution_history, remaining_plan):
-    """Build the reflection prompt for the LLM."""
+def _resolve_item_names(plan, name_resolver):
+    """Resolve the plan's item names, print each correction and return (plan, corrections made)."""
+    plan, corrections = resolve_plan_item_names(plan, name_resolver)
+    for _, original, resolved in corrections:
+        print(f"Resolved item name {original!r} -> {resolved!r}")
+    return plan, len(corrections)
+
+def _compile_into(plan, inventory_df, available_functions, bound_calls):
+    """Compile `plan`, register its bound calls and return the (possibly repaired) tasks."""
+    compiled = compile_plan(plan, inventory_df, available_functions)
+    for step in compiled:
+        for repair in step.repairs:
+            print(f"Repaired plan: {repair}")
+        bound_calls[id(step.task)] = (step.task, step.call)
+    return [step.task for step in compiled]
+
+def _bound_call_for(task, bound_calls):
+    entry = bound_calls.get(id(task))
+    return entry[1] if entry is not None and entry[0] is task else None
+
+def _run_plan_task(task, inventory_df, available_functions, tool_cache=None, bound_call=None):
+    """
+    Run one plan task, catching any error. `bound_call` is the task's compiled
+    call from compile_plan(), if it was validated.
+    
+    Returns:
+        tuple: (result, "SUCCESS", cache outcome, seconds) or (error message, "FAILED",
+               cache outcome, seconds). The cache outcome is "hit" or "miss" for
+               memoized tools, otherwise None; seconds is the tool's wall time.
+    """
+    start = time.perf_counter()
+    hits_before = tool_cache.hits if tool_cache is not None else 0
+    misses_before = tool_cache.misses if tool_cache is not None else 0
+    
+    if bound_call is not None:
+        try:
+            result, status = bound_call(), "SUCCESS"
+        except Exception as e:
+            result, status = str(e), "FAILED"
+    else:
+        result, status = _call_plan_task(task, inventory_df, available_functions)
+    
+    cache_outcome = None
+    if tool_cache is not None:
+        if tool_cache.hits > hits_before:
+            cache_outcome = "hit"
+        elif tool_cache.misses > misses_before:
+            cache_outcome = "miss"
+    return result, status, cache_outcome, time.perf_counter() - start
+
+def _call_plan_task(task, inventory_df, available_functions):
+    try:
+        function_to_call = available_functions[task['task']]
+        
+        # Add inventory_df to args if it's expected
+        args = copy.deepcopy(task['args'])
+        if 'df' in args and args['df'] == 'inventory_df':
+            args['df'] = inventory_df
+        
+        return function_to_call(**args), "SUCCESS"
+    
+    except Exception as e:
+        return str(e), "FAILED"
+
+def build_reflection_prompt(user_query, execution_history, remaining_plan, history_formatter=None):
+    """
+    Build the reflection prompt for the LLM.
+    
+    Pass an ExecutionHistoryFormatter to format the history incrementally (and
+    within its token budget) instead of rebuilding it on every reflection.
+    """
     
-    history_text = format_execution_history(execution_history)
+    if history_formatter is not None:
+        history_text = history_formatter.format(execution_history)
+        plan_text = history_formatter.format_plan(remaining_plan)
+    else:
+        history_text = format_execution_history(execution_history)
+        plan_text = json.dumps(remaining_plan, indent=2)
     
     reflection_prompt = f"""
 ORIGINAL REQUEST: {user_query}
@@ -336,7 +1031,7 @@ EXECUTION HISTORY:
 {history_text}
 
 CURRENT REMAINING PLAN:
-{json.dumps(remaining_plan, indent=2)}
+{plan_text}
 
 Based on the execution results above, do any of the remaining planned tasks need to be updated?
 
@@ -357,38 +1052,64 @@ PLAN: [updated JSON array of remaining tasks, or "NO_CHANGES_NEEDED"]
 
 def format_execution_history(history):
     """Format execution history for display."""
-    formatted = ""
-    for i, record in enumerate(history):
-        if record.get("status") == "PLAN_REVISION":
-            formatted += f"Step {i+1}: {record['task']} - {record['result']}\n"
-        else:
-            formatted += f"Step {i+1}: Called {record['task']['task']} with args {record['task']['args']}\n"
-            formatted += f"         Result: {record['result']}\n"
-            formatted += f"         Status: {record['status']}\n\n"
-    return formatted
+    return "".join(format_history_record(i, record) for i, record in enumerate(history))
 
-def call_llm_for_reflection(client, context, planning_instruction, reflection_prompt):
-    """Call LLM for reflection step."""
+def call_llm_for_reflection(client, context, planning_instruction, reflection_prompt, stream=False, usage=None):
+    """
+    Call LLM for reflection step.
+    
+    With stream=True the response is streamed and parsed as it arrives; text after
+    the PLAN section (NO_CHANGES_NEEDED or the closed array) is ignored, but the
+    stream is read to the end for the usage in its last chunk.
+    
+    Pass a dict as `usage` to have it filled with latency_s and the response's
+    prompt_tokens / completion_tokens (None if the API reports no usage).
+    """
+    usage = usage if usage is not None else {}
+    usage.update(prompt_tokens=None, completion_tokens=None)
+    start = time.perf_counter()
     
     full_prompt = f"{context}\n{planning_instruction}\n\n{reflection_prompt}"
+    messages = [
+        {"role": "system", "content": "You are a helpful assistant that reflects on task execution and updates plans when needed."},
+        {"role": "user", "content": full_prompt}
+    ]
     
     try:
+        if stream:
+            parser = StreamingPlanParser()
+            for _ in stream_llm_plan(client, messages, parser=parser, usage=usage, temperature=0.1, max_tokens=2000):
+                pass
+            usage["latency_s"] = time.perf_counter() - start
+            # Drop anything streamed past the end of the plan
+            llm_text = parser.text[:parser.end].strip()
+            print(llm_text)
+            return llm_text
+        
         response = client.chat.completions.create(
             model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that reflects on task execution and updates plans when needed."},
-                {"role": "user", "content": full_prompt}
-            ],
+            messages=messages,
             temperature=0.1,
             max_tokens=2000
         )
+        usage["latency_s"] = time.perf_counter() - start
+        usage.update(_usage_counts(getattr(response, "usage", None)))
         print(response.choices[0].message.content.strip())
         return response.choices[0].message.content.strip()
         
     except Exception as e:
+        usage["latency_s"] = time.perf_counter() - start
         print(f"Error calling OpenAI API for reflection: {e}")
         return "NO_CHANGES_NEEDED"
 
+def _usage_counts(response_usage):
+    if response_usage is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(response_usage, "prompt_tokens", None),
+        "completion_tokens": getattr(response_usage, "completion_tokens", None),
+    }
+
 def extract_plan_from_response(llm_response):
     """Extract plan from LLM response."""
     try:
@@ -406,4 +1127,80 @@ def extract_plan_from_response(llm_response):
             
     except json.JSONDecodeError:
         print(f"Failed to parse reflection response: {llm_response}")
-        return None
\ No newline at end of file
+        return None
+
+def stream_llm_plan(client, messages, model="gpt-4o", parser=None, usage=None, **create_kwargs):
+    """
+    Stream a planning (or reflection) completion and yield each task as soon as it closes.
+    
+    Args:
+        client: OpenAI-compatible client
+        messages (list): Chat messages for the request
+        model (str): Model name
+        parser (StreamingPlanParser): Optional parser to use, e.g. to read .text afterwards
+        usage (dict): Optional dict updated with prompt_tokens / completion_tokens.
+                      Usage is requested (stream_options={"include_usage": True}) and
+                      arrives in the last chunk, so the stream is read to the end
+        **create_kwargs: Extra arguments for client.chat.completions.create
+    
+    Yields:
+        dict: Task dictionaries with 'task' and 'args' keys, in plan order
+    
+    Without `usage`, reading stops (and generation is cancelled) as soon as the plan
+    is complete. With it, the rest of the stream is read but not parsed.
+    """
+    parser = parser if parser is not None else StreamingPlanParser()
+    if usage is not None:
+        create_kwargs.setdefault("stream_options", {"include_usage": True})
+    response = client.chat.completions.create(
+        model=model, messages=messages, stream=True, **create_kwargs
+    )
+    try:
+        for chunk in response:
+            if usage is not None and getattr(chunk, "usage", None) is not None:
+                usage.update(_usage_counts(chunk.usage))
+            if parser.done or not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if not content:
+                continue
+            yield from parser.feed(content)
+            if parser.done and usage is None:
+                break
+    finally:
+        # Stop generation early if the plan completed before the stream did
+        close = getattr(response, "close", None)
+        if close is not None:
+            close()
+
+def execute_plan_streaming(client, messages, inventory_df, available_functions, model="gpt-4o", usage=None,
+                           **create_kwargs):
+    """
+    Plan and execute at the same time: each task runs as soon as the LLM has finished writing it.
+    
+    The response must use the usual "PLAN: [...]" format. Tasks run sequentially in
+    plan order with the same log as execute_plan().
+    
+    Args:
+        client: OpenAI-compatible client
+        messages (list): Chat messages for the planning request
+        inventory_df (pd.DataFrame | InventoryStore): The inventory DataFrame or store
+        available_functions (dict): Dictionary mapping function names to function objects
+        model (str): Model name
+        usage (dict): Optional dict filled with the response's prompt_tokens / completion_tokens;
+                      the stream is then read to its end (see stream_llm_plan)
+        **create_kwargs: Extra arguments for client.chat.completions.create
+    
+    Returns:
+        tuple: (plan, results) - the parsed plan and the result of each task
+    """
+    plan = []
+    results = []
+    
+    for step in stream_llm_plan(client, messages, model=model, usage=usage, **create_kwargs):
+        plan.append(step)
+        result = execute_step(step, inventory_df, available_functions)
+        results.append(result)
+        print(f"Executed {step['task']}: {result}")
+    
+    return plan, results
@@ -0,0 +1,342 @@
+"""
+Append-friendly ledgers for the inventory tools in inventory_utils.
+
+create_ledger_dataframe() returns an empty DataFrame that callers grow row by
+row, and every pandas append copies the whole frame. SalesLedger keeps each
+column in a typed array.array buffer that grows amortized, and only builds a
+DataFrame when asked.
+
+TransactionLog replaces the stored balance_after_transaction column of
+create_transaction_dataframe() with an append-only event file plus periodic
+snapshots of the register balance and inventory.
+"""
+
+import bisect
+import json
+import os
+
+from array import array
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+LEDGER_COLUMNS = ['transaction_date', 'item_id', 'quantity', 'transaction_type']
+
+TRANSACTION_COLUMNS = [
+    'transaction_id', 'customer_name', 'transaction_summary',
+    'transaction_amount', 'balance_after_transaction',
+]
+
+
+def _to_datetime64_ns(value):
+    """Convert a date-like value (datetime, date, str, np.datetime64) to int64 nanoseconds."""
+    return pd.Timestamp(value).as_unit('ns').value
+
+
+class SalesLedger:
+    """
+    Columnar sales ledger with the create_ledger_dataframe() columns.
+
+    Buffers:
+        transaction_date: int64 nanoseconds, exposed as datetime64[ns]
+        item_id: int32 codes into a table of item ids, exposed as categorical
+        quantity: int32
+        transaction_type: int16 codes, exposed as categorical
+    """
+
+    def __init__(self):
+        self._dates = array('q')
+        self._item_codes = array('i')
+        self._quantities = array('i')
+        self._type_codes = array('h')
+
+        self._item_ids = []
+        self._item_lookup = {}
+        self._transaction_types = []
+        self._type_lookup = {}
+
+        # Ledgers usually log many rows for the same date, so the last
+        # converted date is cached to skip the Timestamp conversion
+        self._last_date = None
+        self._last_date_ns = 0
+
+        self._frame = None
+
+    def __len__(self):
+        return len(self._quantities)
+
+    def __repr__(self):
+        return f"SalesLedger({len(self)} rows)"
+
+    def _code_for(self, value, values, lookup):
+        """Return the code for `value`, adding it to the category table if new."""
+        code = len(values)
+        values.append(value)
+        lookup[value] = code
+        return code
+
+    def append(self, transaction_date, item_id, quantity, transaction_type):
+        """
+        Record one ledger row.
+
+        Args:
+            transaction_date: Date of the transaction (datetime, date, str or np.datetime64)
+            item_id (str): The item_id of the item, e.g. 'SG001'
+            quantity (int): Units in the transaction
+            transaction_type (str): e.g. 'sale' or 'return'
+        """
+        if transaction_date is not self._last_date:
+            self._last_date_ns = _to_datetime64_ns(transaction_date)
+            self._last_date = transaction_date
+
+        item_code = self._item_lookup.get(item_id)
+        if item_code is None:
+            item_code = self._code_for(item_id, self._item_ids, self._item_lookup)
+
+        type_code = self._type_lookup.get(transaction_type)
+        if type_code is None:
+            type_code = self._code_for(transaction_type, self._transaction_types, self._type_lookup)
+
+        self._dates.append(self._last_date_ns)
+        self._item_codes.append(item_code)
+        self._quantities.append(quantity)
+        self._type_codes.append(type_code)
+        self._frame = None
+
+    def extend(self, rows):
+        """
+        Record many ledger rows.
+
+        Args:
+            rows (iterable): (transaction_date, item_id, quantity, transaction_type) tuples
+        """
+        append = self.append
+        for transaction_date, item_id, quantity, transaction_type in rows:
+            append(transaction_date, item_id, quantity, transaction_type)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the column buffers (excluding the small category tables)."""
+        return sum(
+            buffer.itemsize * len(buffer)
+            for buffer in (self._dates, self._item_codes, self._quantities, self._type_codes)
+        )
+
+    def to_dataframe(self):
+        """
+        Build a DataFrame of the ledger, cached until the next append.
+
+        Returns:
+            pd.DataFrame: Columns transaction_date, item_id, quantity and transaction_type
+        """
+        if self._frame is None:
+            # np.array copies the buffers so the arrays stay free to grow
+            self._frame = pd.DataFrame({
+                'transaction_date': np.array(self._dates, dtype=np.int64).view('datetime64[ns]'),
+                'item_id': pd.Categorical.from_codes(
+                    np.array(self._item_codes, dtype=np.int32), categories=self._item_ids
+                ),
+                'quantity': np.array(self._quantities, dtype=np.int32),
+                'transaction_type': pd.Categorical.from_codes(
+                    np.array(self._type_codes, dtype=np.int16), categories=self._transaction_types
+                ),
+            }, columns=LEDGER_COLUMNS)
+        return self._frame
+
+
+class TransactionLog:
+    """
+    Event-sourced register transactions stored in a local directory.
+
+    Files:
+        events.jsonl: One JSON event per transaction, append-only
+        snapshot_index.jsonl: One line per snapshot (ts, seq, balance, byte offset)
+        snapshots/<seq>.json: Balance and inventory as of event `seq`
+
+    Opening an existing directory loads the latest snapshot and replays only
+    the events written after it. The register balance is the running sum of
+    transaction amounts, the first of which is the opening balance.
+    """
+
+    def __init__(self, directory, opening_balance=500.00, opening_inventory=None, snapshot_every=1000,
+                 opening_timestamp=None):
+        """
+        Args:
+            directory (str): Directory for the log files, created if missing
+            opening_balance (float): Opening register balance, used only for a new log
+            opening_inventory (dict): item_id -> quantity in stock, used only for a new log
+            snapshot_every (int): Write a snapshot after this many events
+            opening_timestamp: When the log opens, used only for a new log; defaults to now.
+                               Set it to backfill transactions dated before today.
+        """
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self._events_path = os.path.join(directory, 'events.jsonl')
+        self._index_path = os.path.join(directory, 'snapshot_index.jsonl')
+        self._snapshot_dir = os.path.join(directory, 'snapshots')
+        os.makedirs(self._snapshot_dir, exist_ok=True)
+
+        self.balance = 0.0
+        self.inventory = {}
+        self.seq = 0
+        self._last_ts = None
+        # (ts, seq, balance, offset) for every snapshot, ordered by seq
+        self._snapshots = []
+
+        self._load()
+        self._events = open(self._events_path, 'ab')
+
+        if self.seq == 0:
+            self.record(
+                'OPENING_BALANCE',
+                'Daily opening register balance',
+                opening_balance,
+                inventory_changes=opening_inventory,
+                timestamp=opening_timestamp,
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __repr__(self):
+        return f"TransactionLog({self.directory!r}, {self.seq} events, balance={self.balance:.2f})"
+
+    def close(self):
+        self._events.close()
+
+    def _load(self):
+        """Restore state from the latest snapshot and replay the events after it."""
+        offset = 0
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                self._snapshots = [tuple(json.loads(line)) for line in f if line.strip()]
+
+        if self._snapshots:
+            ts, seq, balance, offset = self._snapshots[-1]
+            with open(self._snapshot_path(seq)) as f:
+                snapshot = json.load(f)
+            self.seq = seq
+            self.balance = balance
+            self.inventory = snapshot['inventory']
+            self._last_ts = ts
+
+        if not os.path.exists(self._events_path):
+            return
+
+        with open(self._events_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # A crash mid-write leaves a partial last line; drop it
+                    self._truncate_events(offset)
+                    break
+                self._apply(json.loads(line))
+                offset += len(line)
+
+    def _truncate_events(self, size):
+        with open(self._events_path, 'r+b') as f:
+            f.truncate(size)
+
+    def _apply(self, event):
+        self.seq = event['seq']
+        self.balance += event['transaction_amount']
+        self._last_ts = event['ts']
+        for item_id, change in event.get('inventory', {}).items():
+            self.inventory[item_id] = self.inventory.get(item_id, 0) + change
+
+    def _snapshot_path(self, seq):
+        return os.path.join(self._snapshot_dir, f"{seq:012d}.json")
+
+    def record(self, customer_name, transaction_summary, transaction_amount, inventory_changes=None, timestamp=None):
+        """
+        Append a transaction to the log.
+
+        Args:
+            customer_name (str): Customer for the transaction
+            transaction_summary (str): Short description
+            transaction_amount (float): Signed change to the register balance
+            inventory_changes (dict): item_id -> signed change in stock
+            timestamp: When the transaction happened, defaults to now; must not go backwards
+
+        Returns:
+            str: The new transaction_id, e.g. 'TXN002'
+        """
+        ts = _to_datetime64_ns(datetime.now() if timestamp is None else timestamp)
+        if self._last_ts is not None and ts < self._last_ts:
+            raise ValueError("Transaction timestamps must not go backwards")
+
+        event = {
+            'seq': self.seq + 1,
+            'ts': ts,
+            'transaction_id': f"TXN{self.seq + 1:03d}",
+            'customer_name': customer_name,
+            'transaction_summary': transaction_summary,
+            'transaction_amount': float(transaction_amount),
+        }
+        if inventory_changes:
+            event['inventory'] = {item_id: int(change) for item_id, change in inventory_changes.items()}
+
+        self._events.write(json.dumps(event).encode() + b'\n')
+        self._events.flush()
+        self._apply(event)
+
+        if self.seq % self.snapshot_every == 0:
+            self.snapshot()
+        return event['transaction_id']
+
+    def snapshot(self):
+        """Write a snapshot of the current balance and inventory."""
+        offset = self._events.tell()
+        path = self._snapshot_path(self.seq)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'seq': self.seq, 'balance': self.balance, 'inventory': self.inventory}, f)
+        os.replace(tmp_path, path)
+
+        entry = (self._last_ts, self.seq, self.balance, offset)
+        with open(self._index_path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        self._snapshots.append(entry)
+
+    def balance_at(self, timestamp):
+        """
+        Register balance after every transaction at or before `timestamp`.
+
+        Starts from the latest snapshot at or before `timestamp`, so at most
+        `snapshot_every` events are read.
+
+        Returns:
+            float: The balance, or 0.0 before the opening balance was recorded
+        """
+        ts = _to_datetime64_ns(timestamp)
+        position = bisect.bisect_right([entry[0] for entry in self._snapshots], ts)
+        balance, offset = 0.0, 0
+        if position:
+            _, _, balance, offset = self._snapshots[position - 1]
+
+        with open(self._events_path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                event = json.loads(line)
+                if event['ts'] > ts:
+                    break
+                balance += event['transaction_amount']
+        return balance
+
+    def to_dataframe(self):
+        """
+        Replay the whole log into the create_transaction_dataframe() layout.
+
+        Returns:
+            pd.DataFrame: One row per transaction with balance_after_transaction
+        """
+        with open(self._events_path, 'rb') as f:
+            events = [json.loads(line) for line in f]
+        df = pd.DataFrame(events, columns=TRANSACTION_COLUMNS[:-1])
+        df['balance_after_transaction'] = df['transaction_amount'].cumsum()
+        return df
@@ -0,0 +1,260 @@
+"""
+Local item-name resolution for the plan executors in inventory_utils.
+
+A near-miss item name ("aviators", "cat-eye glasses") makes
+check_inventory_by_name return -1, and fixing it costs a reflection LLM call.
+ItemNameResolver maps such names to the canonical inventory name with a
+character-trigram TF-IDF index over item names, aliases and descriptions.
+Plan arguments are only rewritten for close matches, since a wrong match
+would report or sell a different item; looser matches are offered to the
+reflection LLM as suggestions instead.
+"""
+
+import functools
+import math
+import re
+
+from collections import Counter
+
+import numpy as np
+
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def _words(text):
+    return _NON_WORD.sub(' ', str(text).lower()).split()
+
+
+def _trigrams(text):
+    """Character trigrams of each word in `text`, padded with a space on each side."""
+    grams = Counter()
+    for word in _words(text):
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _TrigramIndex:
+    """TF-IDF weighted trigram vectors with an inverted index, for cosine scoring."""
+
+    def __init__(self, texts):
+        grams_per_doc = [_trigrams(text) for text in texts]
+        n_docs = len(texts)
+        doc_freq = Counter(gram for grams in grams_per_doc for gram in grams)
+        # Smoothed idf, as in scikit-learn's TfidfVectorizer
+        self.idf = {gram: math.log((1 + n_docs) / (1 + df)) + 1 for gram, df in doc_freq.items()}
+        self.n_docs = n_docs
+
+        postings = {}
+        for doc, grams in enumerate(grams_per_doc):
+            weights = {gram: count * self.idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                postings.setdefault(gram, ([], []))
+                postings[gram][0].append(doc)
+                postings[gram][1].append(weight / norm)
+
+        self.postings = {
+            gram: (np.array(docs, dtype=np.int64), np.array(weights))
+            for gram, (docs, weights) in postings.items()
+        }
+
+    def scores(self, query, count_unknown=False):
+        """
+        Cosine similarity of `query` to every document.
+
+        Trigrams no document has are ignored, unless count_unknown is set: they
+        then weigh as the rarest trigrams and lower every score, so extra words
+        in the query (e.g. a brand, 'Gucci Aviator') count against a match.
+        """
+        scores = np.zeros(self.n_docs)
+        unseen_idf = math.log(1 + self.n_docs) + 1
+        weights = {
+            gram: count * self.idf.get(gram, unseen_idf)
+            for gram, count in _trigrams(query).items() if count_unknown or gram in self.idf
+        }
+        norm = math.sqrt(sum(w * w for w in weights.values()))
+        if not norm:
+            return scores
+        for gram, weight in weights.items():
+            if gram not in self.postings:
+                continue
+            docs, doc_weights = self.postings[gram]
+            # Each document appears once per posting list, so fancy-index add is safe
+            scores[docs] += doc_weights * (weight / norm)
+        return scores
+
+
+class ItemNameResolver:
+    """
+    Map free-text item references to canonical inventory names.
+
+    Names and aliases are matched on character trigrams, so plurals, typos
+    and hyphenation still hit ("aviators" -> "Aviator"). Descriptions add a
+    weaker signal for descriptive queries. Exact (case-insensitive) names
+    resolve without scoring, and results are cached per query.
+
+    resolve(query, strict=True) is what plan rewrites use. It only
+    compares the query with names and aliases that have the same number of
+    words, counts trigrams no item has against the match, and needs a higher
+    score and margin: plurals and small typos ('aviators', 'Wayfarrer') still
+    resolve, other products ('Clubmaster', 'Gucci Aviator', 'Aviator II') do not.
+    suggest() lists the loose matches for a name that did not resolve.
+
+    Build a new resolver when items are added or renamed.
+    """
+
+    def __init__(self, names, descriptions=None, aliases=None, description_weight=0.5,
+                 min_score=0.5, min_margin=0.05, strict_min_score=0.6, strict_min_margin=0.2,
+                 cache_size=4096):
+        """
+        Args:
+            names (list): Canonical item names
+            descriptions (list): Optional description per item, aligned with `names`
+            aliases (dict): Optional alias -> canonical name, e.g. {'cat-eye': 'Mystique'}
+            description_weight (float): Weight of the description score next to the name score
+            min_score (float): Lowest score resolve() accepts
+            min_margin (float): How far the best match must lead the runner-up for resolve()
+            strict_min_score (float): min_score for resolve(strict=True)
+            strict_min_margin (float): min_margin for resolve(strict=True)
+            cache_size (int): Queries whose result is kept in an LRU cache
+        """
+        self.names = list(names)
+        self.description_weight = description_weight
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.strict_min_score = strict_min_score
+        self.strict_min_margin = strict_min_margin
+
+        row_for_name = {}
+        for row, name in enumerate(self.names):
+            row_for_name.setdefault(name.lower(), row)
+        self._exact = {key: self.names[row] for key, row in row_for_name.items()}
+
+        # Name documents are the names followed by the aliases, each mapped to its item row
+        aliases = aliases or {}
+        unknown = [name for name in aliases.values() if name.lower() not in row_for_name]
+        if unknown:
+            raise ValueError(f"Aliases refer to unknown items: {sorted(set(unknown))}")
+        self._name_rows = np.array(
+            list(range(len(self.names))) + [row_for_name[name.lower()] for name in aliases.values()],
+            dtype=np.int64,
+        )
+        self._names_index = _TrigramIndex(self.names + list(aliases))
+        self._name_word_counts = np.array([len(_words(text)) for text in self.names + list(aliases)])
+        self._descriptions_index = _TrigramIndex(descriptions) if descriptions is not None else None
+
+        self._resolve_cached = functools.lru_cache(maxsize=cache_size)(self._resolve)
+
+    @classmethod
+    def from_inventory(cls, inventory, aliases=None, **kwargs):
+        """
+        Build a resolver over the names and descriptions of an inventory.
+
+        Args:
+            inventory (pd.DataFrame | InventoryStore): Inventory with 'name' and 'description' columns
+            aliases (dict): Optional alias -> canonical name
+            **kwargs: Passed to ItemNameResolver
+        """
+        df = inventory.df if hasattr(inventory, 'find_row') else inventory
+        descriptions = df['description'].tolist() if 'description' in df.columns else None
+        return cls(df['name'].tolist(), descriptions, aliases, **kwargs)
+
+    def __repr__(self):
+        return f"ItemNameResolver({len(self.names)} items)"
+
+    def _item_scores(self, query, strict=False):
+        name_scores = np.zeros(len(self.names))
+        doc_scores = self._names_index.scores(query, count_unknown=strict)
+        if strict:
+            doc_scores[self._name_word_counts != len(_words(query))] = 0.0
+        np.maximum.at(name_scores, self._name_rows, doc_scores)
+        if strict or self._descriptions_index is None:
+            return name_scores
+        return name_scores + self.description_weight * self._descriptions_index.scores(query)
+
+    def matches(self, query, k=3):
+        """
+        Best-scoring items for `query`.
+
+        Returns:
+            list: Up to k (name, score) tuples, best first; exact names score 1.0 plus the description weight
+        """
+        scores = self._item_scores(query)
+        exact = self._exact.get(str(query).lower())
+        if exact is not None:
+            scores[self.names.index(exact)] = 1.0 + self.description_weight
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [(self.names[row], float(scores[row])) for row in top if scores[row] > 0]
+
+    def _resolve(self, query, strict):
+        exact = self._exact.get(query.lower())
+        if exact is not None:
+            return exact
+
+        scores = self._item_scores(query, strict)
+        top = np.argsort(-scores, kind='stable')[:2]
+        best = scores[top[0]] if len(top) else 0.0
+        runner_up = scores[top[1]] if len(top) > 1 else 0.0
+        min_score, min_margin = (
+            (self.strict_min_score, self.strict_min_margin) if strict else (self.min_score, self.min_margin)
+        )
+        if best < min_score or best - runner_up < min_margin:
+            return None
+        return self.names[top[0]]
+
+    def suggest(self, query, k=3):
+        """
+        Loose matches for a reference that is not an item name, for the reflection
+        LLM to choose from; unlike resolve(strict=True), nothing is rewritten.
+
+        Returns:
+            list: Up to k names scoring at least min_score, best first; empty for a known name
+        """
+        if not isinstance(query, str) or query.lower() in self._exact:
+            return []
+        return [name for name, score in self.matches(query, k) if score >= self.min_score]
+
+    def resolve(self, query, strict=False):
+        """
+        Canonical name for `query`, or None if nothing matches clearly enough.
+
+        Args:
+            query (str): Item reference, e.g. 'aviators'
+            strict (bool): Use the stricter rules for steps that change stock
+
+        Returns:
+            str | None: The canonical item name
+        """
+        if not isinstance(query, str):
+            return None
+        return self._resolve_cached(query, strict)
+
+
+def resolve_plan_item_names(plan, resolver):
+    """
+    Replace near-miss item_name arguments in a plan with canonical names.
+
+    Every step is resolved with strict=True, so a check and a sale of the same
+    name agree. Tasks that change are copied; the others are returned as they are.
+
+    Args:
+        plan (list): Task dictionaries with 'task' and 'args' keys
+        resolver (ItemNameResolver): The resolver to use
+
+    Returns:
+        tuple: (plan, corrections) - the resolved plan and a list of
+               (step index, original name, resolved name) tuples
+    """
+    resolved_plan = []
+    corrections = []
+    for index, task in enumerate(plan):
+        args = task.get('args') if isinstance(task, dict) else None
+        item_name = args.get('item_name') if isinstance(args, dict) else None
+        resolved = resolver.resolve(item_name, strict=True) if isinstance(item_name, str) else None
+        if resolved is not None and resolved.lower() != item_name.lower():
+            task = {**task, 'args': {**args, 'item_name': resolved}}
+            corrections.append((index, item_name, resolved))
+        resolved_plan.append(task)
+    return resolved_plan, corrections
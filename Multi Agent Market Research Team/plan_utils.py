@@ -0,0 +1,863 @@
+"""
+Plan analysis helpers for the executors in inventory_utils.
+
+A plan is a list of {'task': <tool name>, 'args': {...}} dictionaries, as
+produced by the planning LLM call.
+"""
+
+import copy
+import difflib
+import functools
+import inspect
+import json
+import os
+import threading
+
+from collections import Counter, OrderedDict, deque, namedtuple
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a ~4 characters/token estimate
+    tiktoken = None
+
+from inventory_store import get_inventory_version
+
+
+# Resource keys a step can read or write
+ALL_STOCK = ('stock', '*')
+ITEM_NAMES = ('names',)
+EVERYTHING = ('*',)
+
+INVENTORY_PLACEHOLDER = 'inventory_df'
+
+REFLECTION_POLICIES = ('always', 'adaptive')
+
+STOCK_WRITE_TOOLS = ('update_stock', 'sell_if_in_stock')
+
+READ_ONLY_TOOLS = ('check_inventory_by_name', 'get_formatted_item_names', 'get_low_stock_items')
+
+
+def _stock_key(args):
+    item_name = args.get('item_name')
+    if isinstance(item_name, str):
+        return ('stock', item_name.lower())
+    return ALL_STOCK
+
+
+def step_effects(step, fine_grained=True):
+    """
+    Work out which parts of the inventory a plan step reads and writes.
+
+    Known inventory tools are tracked per item. A tool that is not known but is
+    handed the inventory is assumed to read and write all of it; a tool that
+    never sees the inventory (e.g. a web search) touches none of it.
+
+    Args:
+        step (dict): Task dictionary with 'task' and 'args' keys
+        fine_grained (bool): Track writes per item. Pass False when the inventory is a
+                             plain DataFrame, which is not safe to read while it is written.
+
+    Returns:
+        tuple: (reads, writes) as sets of resource keys
+    """
+    task = step['task']
+    args = step.get('args', {})
+
+    if task == 'check_inventory_by_name':
+        return {_stock_key(args)}, set()
+    if task == 'get_formatted_item_names':
+        return {ITEM_NAMES}, set()
+    if task == 'get_low_stock_items':
+        return {ALL_STOCK}, set()
+
+    if task in STOCK_WRITE_TOOLS:
+        key = _stock_key(args)
+        writes = {key} if fine_grained else {EVERYTHING}
+        return {key}, writes
+    if task == 'update_stock_bulk':
+        return set(), {ALL_STOCK} if fine_grained else {EVERYTHING}
+
+    if INVENTORY_PLACEHOLDER in args.values():
+        return set(), {EVERYTHING}
+    return set(), set()
+
+
+def is_read_only_step(step):
+    """
+    Whether a step is known to have no side effects, so it is safe to run early.
+
+    Only the read-only inventory tools qualify; tools that do not touch the
+    inventory may still have external side effects.
+    """
+    return step['task'] in READ_ONLY_TOOLS
+
+
+def _keys_overlap(key_a, key_b):
+    if key_a == EVERYTHING or key_b == EVERYTHING:
+        return True
+    if key_a[0] != key_b[0]:
+        return False
+    return key_a == key_b or ALL_STOCK in (key_a, key_b)
+
+
+def _any_overlap(keys_a, keys_b):
+    return any(_keys_overlap(key_a, key_b) for key_a in keys_a for key_b in keys_b)
+
+
+def plan_dependencies(plan, fine_grained=True):
+    """
+    Find, for every step, the earlier steps it has to wait for.
+
+    Step j depends on an earlier step i when one of them writes something the
+    other reads or writes. Steps with no path between them can run at the same
+    time without changing any result.
+
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+        fine_grained (bool): Passed to step_effects()
+
+    Returns:
+        list: One set of earlier step indexes per step
+    """
+    effects = [step_effects(step, fine_grained) for step in plan]
+    dependencies = []
+
+    for j, (reads_j, writes_j) in enumerate(effects):
+        depends_on = set()
+        for i in range(j):
+            reads_i, writes_i = effects[i]
+            if (_any_overlap(writes_i, reads_j | writes_j)
+                    or _any_overlap(writes_j, reads_i)):
+                depends_on.add(i)
+        dependencies.append(depends_on)
+
+    return dependencies
+
+
+def reflection_triggers(record, remaining_plan):
+    """
+    Cheap local check for whether a step's outcome calls for LLM reflection.
+
+    Args:
+        record (dict): Execution record with 'task', 'result' and 'status'
+        remaining_plan (list): Task dictionaries still to run
+
+    Returns:
+        list: Human-readable reasons to reflect; empty if the step was unremarkable
+    """
+    task = record['task']
+    task_name = task['task']
+    result = record['result']
+
+    if record['status'] != 'SUCCESS':
+        return [f"{task_name} failed: {result}"]
+    if task_name == 'check_inventory_by_name' and result == -1:
+        return [f"item {task['args'].get('item_name')!r} not found"]
+    if task_name in STOCK_WRITE_TOOLS and result is False:
+        return [f"{task_name} rejected for {task['args'].get('item_name')!r}"]
+
+    triggers = []
+    if task_name == 'get_formatted_item_names' and isinstance(result, list):
+        known_names = {name.lower() for name in result if isinstance(name, str)}
+        for step in remaining_plan:
+            item_name = step.get('args', {}).get('item_name')
+            if isinstance(item_name, str) and item_name.lower() not in known_names:
+                triggers.append(f"later step {step['task']} uses unknown item {item_name!r}")
+
+    if task_name == 'check_inventory_by_name':
+        item_key = _stock_key(task['args'])
+        for step in remaining_plan:
+            args = step.get('args', {})
+            if step['task'] not in STOCK_WRITE_TOOLS or _stock_key(args) != item_key:
+                continue
+            # Only the next write to this item can be judged from the checked quantity
+            if step['task'] == 'sell_if_in_stock' or str(args.get('transaction_type', '')).lower() == 'sale':
+                quantity = args.get('quantity')
+                if isinstance(quantity, (int, float)) and quantity > result:
+                    triggers.append(f"later sale of {quantity} {args.get('item_name')!r} exceeds stock of {result}")
+            break
+
+    return triggers
+
+
+def format_history_record(index, record, result_text=None):
+    """
+    Format one execution record the way format_execution_history() does.
+
+    Args:
+        index (int): Zero-based position of the record in the history
+        record (dict): Execution record
+        result_text (str): Replacement text for the result, e.g. a truncated version
+    """
+    if result_text is None:
+        result_text = str(record['result'])
+    if not isinstance(record['task'], dict):
+        return f"Step {index+1}: {record['task']} - {result_text}\n"
+    suggestions = record.get('name_suggestions')
+    return (
+        f"Step {index+1}: Called {record['task']['task']} with args {record['task']['args']}\n"
+        f"         Result: {result_text}\n"
+        f"         Status: {record['status']}\n"
+        + (f"         Similar item names: {', '.join(suggestions)}\n" if suggestions else "")
+        + "\n"
+    )
+
+
+# (metric name, record key, help text) for write_execution_records(format='prometheus')
+STEP_METRICS = (
+    ('plan_step_tool_seconds', 'tool_time_s', 'Wall time of the step\'s tool call.'),
+    ('plan_step_reflection_seconds', 'reflection_latency_s', 'Reflection LLM latency after the step.'),
+    ('plan_step_reflection_attempts', 'reflection_attempts', 'Reflection LLM calls after the step.'),
+    ('plan_step_prompt_tokens', 'prompt_tokens', 'Prompt tokens of the reflection calls after the step.'),
+    ('plan_step_completion_tokens', 'completion_tokens', 'Completion tokens of the reflection calls after the step.'),
+)
+
+
+def _prometheus_labels(labels):
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels.items()
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def format_prometheus_metrics(records, labels=None):
+    """
+    Render the timing and token fields of execution records in Prometheus text format.
+
+    Each step gets one sample per STEP_METRICS entry, labelled with its position,
+    task and status, plus a plan_* sample summing it over the plan.
+    Records without the field (e.g. REFLECTION or STATS records) are skipped, and
+    so are unknown (None) token counts; a plan total with an unknown part is NaN.
+
+    Args:
+        records (list): Records returned by execute_plan_with_reflection()
+        labels (dict): Extra labels for every sample, e.g. {'run_id': '42'}
+
+    Returns:
+        str: The exposition text, ending in a newline
+    """
+    labels = dict(labels or {})
+    lines = []
+    for metric, key, help_text in STEP_METRICS:
+        samples = [
+            (index, record) for index, record in enumerate(records)
+            if isinstance(record.get('task'), dict) and key in record
+        ]
+        unknown = any(record[key] is None for _, record in samples)
+        samples = [(index, record) for index, record in samples if record[key] is not None]
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for index, record in samples:
+            step_labels = {
+                **labels, 'step': index + 1, 'task': record['task'].get('task'), 'status': record['status'],
+            }
+            lines.append(f'{metric}{_prometheus_labels(step_labels)} {record[key]}')
+
+        total_metric = metric.replace('plan_step_', 'plan_')
+        lines.append(f'# HELP {total_metric} {help_text[:-1]}, summed over the plan.')
+        lines.append(f'# TYPE {total_metric} gauge')
+        total = 'NaN' if unknown else sum(record[key] for _, record in samples)
+        lines.append(f'{total_metric}{_prometheus_labels(labels) if labels else ""} {total}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_execution_records(records, path, format='jsonl', labels=None):
+    """
+    Export execution records as JSON lines (appended) or a Prometheus text file (replaced).
+
+    The Prometheus file suits node_exporter's textfile collector; it is written
+    to a temporary file and renamed so a scrape never sees half of it.
+
+    Args:
+        records (list): Records returned by execute_plan_with_reflection()
+        path (str): Output file
+        format (str): 'jsonl' or 'prometheus'
+        labels (dict): Extra fields added to every JSON line / labels on every sample
+    """
+    if format == 'jsonl':
+        with open(path, 'a') as f:
+            for record in records:
+                # Results can be numpy scalars or other objects; fall back to str()
+                f.write(json.dumps({**(labels or {}), **record}, default=str) + '\n')
+    elif format == 'prometheus':
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(format_prometheus_metrics(records, labels))
+        os.replace(tmp_path, path)
+    else:
+        raise ValueError(f"format must be 'jsonl' or 'prometheus', got {format!r}")
+
+
+class ExecutionHistoryFormatter:
+    """
+    Incremental, token-budgeted replacement for format_execution_history().
+
+    Each record is formatted once, when it is first seen. Results longer than
+    `max_result_tokens` are truncated, and when the history exceeds
+    `token_budget` the oldest steps are folded into a one-line summary, so the
+    reflection prompt stops growing with the plan. With both limits left at
+    None the output is identical to format_execution_history().
+    """
+
+    def __init__(self, token_budget=None, max_result_tokens=None, model="gpt-4o"):
+        """
+        Args:
+            token_budget (int): Max tokens for the formatted history, or None for no limit
+            max_result_tokens (int): Max tokens per step result, or None for no limit
+            model (str): Model whose tokenizer is used to count tokens
+        """
+        self.token_budget = token_budget
+        self.max_result_tokens = max_result_tokens
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("o200k_base")
+
+        self._records_seen = 0
+        # (text, tokens, record) for every step still shown verbatim
+        self._entries = deque()
+        self._entry_tokens = 0
+        self._summarized_steps = 0
+        self._summarized_status = Counter()
+        self._summarized_tasks = Counter()
+
+        # id(task) -> (task, JSON text) for the remaining-plan section
+        self._plan_json = {}
+
+    def count_tokens(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(text) // 4 + 1
+
+    def _truncate(self, text, max_tokens):
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            return f"{self._encoding.decode(tokens[:max_tokens])}... [truncated {len(tokens) - max_tokens} tokens]"
+        if len(text) <= max_tokens * 4:
+            return text
+        return f"{text[:max_tokens * 4]}... [truncated {len(text) - max_tokens * 4} characters]"
+
+    def _result_text(self, result):
+        if self.max_result_tokens is None:
+            return str(result)
+        if isinstance(result, list) and self.count_tokens(str(result)) > self.max_result_tokens:
+            # Keep whole items where possible so the LLM still sees valid names
+            shown = []
+            for item in result:
+                if self.count_tokens(str(shown + [item])) > self.max_result_tokens:
+                    break
+                shown.append(item)
+            return f"{shown} ... ({len(result) - len(shown)} more items)"
+        return self._truncate(str(result), self.max_result_tokens)
+
+    def _summary_line(self):
+        if not self._summarized_steps:
+            return ""
+        statuses = ", ".join(f"{count} {status}" for status, count in self._summarized_status.items())
+        tasks = ", ".join(f"{task} x{count}" for task, count in self._summarized_tasks.most_common())
+        return f"Steps 1-{self._summarized_steps} (summarized): {statuses}; tasks: {tasks}\n\n"
+
+    def _add(self, record):
+        index = self._records_seen
+        self._records_seen += 1
+        text = format_history_record(index, record, self._result_text(record['result']))
+        tokens = self.count_tokens(text)
+        self._entries.append((text, tokens, record))
+        self._entry_tokens += tokens
+
+        if self.token_budget is None:
+            return
+        # Fold the oldest steps into the summary, always keeping the newest one
+        while len(self._entries) > 1 and self._entry_tokens > self.token_budget:
+            _, old_tokens, old_record = self._entries.popleft()
+            self._entry_tokens -= old_tokens
+            self._summarized_steps += 1
+            self._summarized_status[old_record['status']] += 1
+            task = old_record['task']
+            self._summarized_tasks[task['task'] if isinstance(task, dict) else task] += 1
+
+    def format(self, history):
+        """
+        Format an execution history, processing only records added since the last call.
+
+        Args:
+            history (list): The execution history; it must only ever be appended to
+
+        Returns:
+            str: The formatted history
+        """
+        for record in history[self._records_seen:]:
+            self._add(record)
+        return self._summary_line() + "".join(text for text, _, _ in self._entries)
+
+    def format_plan(self, plan):
+        """
+        Same text as json.dumps(plan, indent=2), reusing the JSON of tasks already serialized.
+        """
+        if not plan:
+            return json.dumps(plan, indent=2)
+
+        cache = {}
+        parts = []
+        for task in plan:
+            cached = self._plan_json.get(id(task))
+            if cached is None or cached[0] is not task:
+                text = json.dumps(task, indent=2).replace("\n", "\n  ")
+                cached = (task, text)
+            cache[id(task)] = cached
+            parts.append(cached[1])
+        # Drop tasks that left the plan so the cache stays the size of the plan
+        self._plan_json = cache
+        return "[\n  " + ",\n  ".join(parts) + "\n]"
+
+
+class ToolResultCache:
+    """
+    LRU memoization of read-only inventory tools, invalidated by the inventory version.
+
+    Entries are keyed by tool name, arguments, the inventory object and its
+    version counter (see get_inventory_version()), so any update_stock() call
+    makes earlier results unreachable instead of stale.
+    """
+
+    def __init__(self, maxsize=256, tools=READ_ONLY_TOOLS):
+        """
+        Args:
+            maxsize (int): Max cached results before the least recently used is evicted
+            tools (tuple): Names of the tools to memoize; they must not have side effects
+        """
+        self.maxsize = maxsize
+        self.tools = tools
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def wrap(self, available_functions):
+        """
+        Returns:
+            dict: A copy of `available_functions` with the read-only tools memoized
+        """
+        return {
+            name: self._memoize(name, func) if name in self.tools else func
+            for name, func in available_functions.items()
+        }
+
+    def _memoize(self, name, func):
+        @functools.wraps(func)
+        def cached(*args, **kwargs):
+            if 'df' in kwargs:
+                df, other_args = kwargs['df'], args
+            else:
+                df, other_args = (args[0], args[1:]) if args else (None, args)
+            other_kwargs = tuple(sorted((key, value) for key, value in kwargs.items() if key != 'df'))
+
+            try:
+                # Read the version before calling, so a write racing the call
+                # files the result under the old version
+                key = (name, id(df), get_inventory_version(df), other_args, other_kwargs)
+                hash(key)
+            except (AttributeError, TypeError):
+                return func(*args, **kwargs)
+
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] is df:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    result = entry[1]
+                    # Hand out copies of lists so callers cannot corrupt the cache
+                    return list(result) if isinstance(result, list) else result
+                self.misses += 1
+
+            result = func(*args, **kwargs)
+            with self._lock:
+                # The entry holds the inventory itself so its id() cannot be reused
+                self._entries[key] = (df, list(result) if isinstance(result, list) else result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            return result
+
+        return cached
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, evictions and the current number of entries
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class StreamingPlanParser:
+    """
+    Incremental parser for the "PLAN: [...]" section of a streamed LLM response.
+
+    Feed text chunks as they arrive; every task object is returned as soon as
+    its closing brace has been received, so execution can start before the
+    rest of the plan has been generated. Like extract_plan_from_response(),
+    parsing starts after the first "PLAN:" and skips a ```json fence.
+    """
+
+    MARKER = "PLAN:"
+    NO_CHANGES = "NO_CHANGES_NEEDED"
+
+    def __init__(self):
+        self.text = ""
+        self.tasks = []
+        self.no_changes = False
+        self.done = False
+        # Length of the text up to the end of the PLAN section, once done
+        self.end = None
+        self._pos = 0
+        self._plan_start = None
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_start = None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of response text.
+
+        Returns:
+            list: Task dictionaries completed by this chunk (often empty)
+        """
+        self.text += chunk
+        if self.done:
+            return []
+
+        if self._plan_start is None:
+            # The marker may straddle two chunks, so look back a few characters
+            found = self.text.find(self.MARKER, max(0, self._pos - len(self.MARKER)))
+            if found < 0:
+                self._pos = len(self.text)
+                return []
+            self._plan_start = self._pos = found + len(self.MARKER)
+
+        if not self._in_array:
+            preamble = self.text[self._plan_start:]
+            if self.NO_CHANGES in preamble:
+                self.no_changes = self.done = True
+                self.end = self._plan_start + preamble.find(self.NO_CHANGES) + len(self.NO_CHANGES)
+                return []
+            bracket = preamble.find("[")
+            if bracket < 0:
+                return []
+            self._in_array = True
+            self._pos = self._plan_start + bracket + 1
+
+        return self._scan()
+
+    def _scan(self):
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                if self._depth == 0 and char == "{":
+                    self._object_start = i
+                self._depth += 1
+            elif char in "}]":
+                if self._depth == 0 and char == "]":
+                    self.done = True
+                    self._pos = self.end = i + 1
+                    return completed
+                self._depth -= 1
+                if self._depth == 0 and char == "}":
+                    task = json.loads(text[self._object_start:i + 1])
+                    self.tasks.append(task)
+                    completed.append(task)
+        self._pos = len(text)
+        return completed
+
+
+class PlanValidationError(ValueError):
+    """Raised by compile_plan() for a plan that cannot be run or repaired."""
+
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__("Invalid plan:\n" + "\n".join(f"- {problem}" for problem in problems))
+
+
+CompiledStep = namedtuple('CompiledStep', ['task', 'call', 'repairs'])
+CompiledStep.__doc__ = """A validated plan step: the (possibly repaired) task, a zero-argument callable and the repairs made."""
+
+
+def tool_signature(func):
+    """inspect.signature(func), computed once per tool."""
+    # Keyed on the unwrapped tool: caching a ToolResultCache wrapper would keep
+    # its cache, and every inventory in it, alive for good
+    return _signature(inspect.unwrap(func))
+
+
+@functools.lru_cache(maxsize=1024)
+def _signature(func):
+    return inspect.signature(func)
+
+
+def _closest(name, candidates):
+    candidates = list(candidates)
+    # Truncated names ('item' for 'item_name') score low on similarity, so try prefixes first
+    prefixed = [candidate for candidate in candidates if candidate.startswith(name)]
+    if len(prefixed) == 1:
+        return prefixed[0]
+    matches = difflib.get_close_matches(name, candidates, n=1, cutoff=0.75)
+    return matches[0] if matches else None
+
+
+def compile_plan(plan, inventory_df, available_functions, repair=True):
+    """
+    Check a whole plan against the tool signatures before any step runs.
+
+    Every step is resolved to its tool, its args are copied once and bound
+    with the 'inventory_df' placeholder filled in, giving a ready-to-call
+    step. With repair=True, near-miss task and argument names are corrected
+    (e.g. 'check_inventory' -> 'check_inventory_by_name') and a missing `df`
+    argument is filled with the inventory.
+
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+        inventory_df: The inventory DataFrame or store bound into `df` arguments
+        available_functions (dict): Dictionary mapping function names to function objects
+        repair (bool): Fix near-miss names locally instead of rejecting the plan
+
+    Returns:
+        list: One CompiledStep per plan step
+
+    Raises:
+        PlanValidationError: If any step has an unknown task, unknown or missing
+            arguments that could not be repaired
+    """
+    compiled = []
+    problems = []
+
+    for index, step in enumerate(plan):
+        label = f"Step {index + 1}"
+        if not isinstance(step, dict) or not isinstance(step.get('task'), str):
+            problems.append(f"{label}: expected a dict with a 'task' name, got {step!r}")
+            continue
+
+        repairs = []
+        task_name = step['task']
+        if task_name not in available_functions:
+            suggestion = _closest(task_name, available_functions) if repair else None
+            if suggestion is None:
+                problems.append(f"{label}: unknown task {task_name!r}")
+                continue
+            repairs.append(f"task {task_name!r} -> {suggestion!r}")
+            task_name = suggestion
+
+        args = step.get('args', {})
+        if not isinstance(args, dict):
+            problems.append(f"{label}: args for {task_name} must be a dict, got {args!r}")
+            continue
+        args = copy.deepcopy(args)
+
+        func = available_functions[task_name]
+        parameters = tool_signature(func).parameters
+        accepts_any = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values())
+
+        unknown_args = []
+        if not accepts_any:
+            for arg_name in list(args):
+                if arg_name in parameters:
+                    continue
+                unused = [name for name in parameters if name not in args]
+                suggestion = _closest(arg_name, unused) if repair else None
+                if suggestion is None:
+                    unknown_args.append(arg_name)
+                    continue
+                repairs.append(f"{task_name} argument {arg_name!r} -> {suggestion!r}")
+                args[suggestion] = args.pop(arg_name)
+        if unknown_args:
+            problems.append(f"{label}: {task_name} has no argument(s) {', '.join(map(repr, unknown_args))}")
+            continue
+
+        if repair and 'df' in parameters and 'df' not in args:
+            repairs.append(f"{task_name} argument 'df' filled with {INVENTORY_PLACEHOLDER!r}")
+            args['df'] = INVENTORY_PLACEHOLDER
+
+        bound_args = dict(args)
+        if bound_args.get('df') == INVENTORY_PLACEHOLDER:
+            bound_args['df'] = inventory_df
+        try:
+            tool_signature(func).bind(**bound_args)
+        except TypeError as e:
+            problems.append(f"{label}: {task_name}: {e}")
+            continue
+
+        task = {**step, 'task': task_name, 'args': args} if repairs else step
+        compiled.append(CompiledStep(task, functools.partial(func, **bound_args), repairs))
+
+    if problems:
+        raise PlanValidationError(problems)
+    return compiled
+
+
+OptimizedPlan = namedtuple('OptimizedPlan', ['plan', 'result_index', 'steps_removed'])
+OptimizedPlan.__doc__ = """Output of optimize_plan(): the shorter plan, where each original step's result comes from, and how many steps were removed."""
+
+
+def _simple_inventory_args(args, allowed):
+    return (
+        isinstance(args, dict)
+        and set(args) <= allowed
+        and args.get('df') == INVENTORY_PLACEHOLDER
+        and isinstance(args.get('item_name', ''), str)
+    )
+
+
+def _stock_delta(args):
+    """Signed stock change of a valid update_stock step, or None if the step would be rejected."""
+    if not _simple_inventory_args(args, {'df', 'item_name', 'transaction_type', 'quantity'}):
+        return None
+    quantity = args.get('quantity')
+    transaction_type = args.get('transaction_type')
+    if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+        return None
+    if not isinstance(transaction_type, str) or transaction_type.lower() not in ('sale', 'return'):
+        return None
+    return -quantity if transaction_type.lower() == 'sale' else quantity
+
+
+def _net_update_is_exact(deltas):
+    """
+    Whether one update of sum(deltas) leaves the same stock as applying them in order.
+
+    update_stock floors stock at 0 after every call, so applying d1..dn ends at
+    max(q0 + net, net - m), where m is the lowest prefix sum (counting the empty
+    prefix, 0). A single update ends at max(q0 + net, 0). These agree for every
+    q0 >= 0 exactly when, for a negative net, m equals the net (no prefix dips
+    below it), and for a positive net, m is 0 (no prefix goes negative).
+    A net of 0 cannot be expressed as one update_stock call.
+    """
+    net = 0
+    lowest = 0
+    for delta in deltas:
+        net += delta
+        lowest = min(lowest, net)
+    if net < 0:
+        return lowest == net
+    return net > 0 and lowest == 0
+
+
+def optimize_plan(plan):
+    """
+    Remove redundant inventory steps from a plan without changing any result.
+
+    - check_inventory_by_name for an item already checked, with no write to that
+      item in between, reuses the earlier result.
+    - get_formatted_item_names runs once; stock updates never change names, so
+      later calls reuse the first result until a tool that may rewrite the
+      inventory runs.
+    - Adjacent update_stock calls for the same item are merged into one net
+      update when the merge is exact (see _net_update_is_exact).
+
+    Steps the optimizer does not understand are kept as written and treated as
+    barriers according to step_effects().
+
+    Args:
+        plan (list): List of task dictionaries with 'task' and 'args' keys
+
+    Returns:
+        OptimizedPlan: `plan` to run, `result_index[i]` giving the position in its
+            results of original step i's result, and `steps_removed`
+    """
+    optimized = []
+    result_index = []
+    checked = {}          # item key -> optimized index of a still-valid check
+    names_lookup = None   # optimized index of a still-valid get_formatted_item_names
+    merge_group = None    # (optimized index, item key, deltas) of the last update_stock
+
+    for step in plan:
+        task_name = step.get('task') if isinstance(step, dict) else None
+        args = step.get('args', {}) if isinstance(step, dict) else {}
+
+        if task_name == 'check_inventory_by_name' and _simple_inventory_args(args, {'df', 'item_name'}) and 'item_name' in args:
+            merge_group = None
+            key = _stock_key(args)
+            if key in checked:
+                result_index.append(checked[key])
+                continue
+            checked[key] = len(optimized)
+
+        elif task_name == 'get_formatted_item_names' and args == {'df': INVENTORY_PLACEHOLDER}:
+            merge_group = None
+            if names_lookup is not None:
+                result_index.append(names_lookup)
+                continue
+            names_lookup = len(optimized)
+
+        elif task_name == 'update_stock' and _stock_delta(args) is not None and 'item_name' in args:
+            key = _stock_key(args)
+            checked.pop(key, None)
+            delta = _stock_delta(args)
+
+            if merge_group is not None and merge_group[1] == key and _net_update_is_exact(merge_group[2] + [delta]):
+                index, _, deltas = merge_group
+                deltas.append(delta)
+                net = sum(deltas)
+                optimized[index] = {
+                    **optimized[index],
+                    'args': {
+                        **optimized[index]['args'],
+                        'transaction_type': 'sale' if net < 0 else 'return',
+                        'quantity': abs(net),
+                    },
+                }
+                result_index.append(index)
+                continue
+            merge_group = (len(optimized), key, [delta])
+
+        else:
+            merge_group = None
+            if task_name is not None:
+                _, writes = step_effects(step)
+                if writes & {EVERYTHING, ALL_STOCK}:
+                    checked.clear()
+                if EVERYTHING in writes:
+                    names_lookup = None
+                for key in writes:
+                    checked.pop(key, None)
+
+        result_index.append(len(optimized))
+        optimized.append(step)
+
+    return OptimizedPlan(optimized, result_index, len(plan) - len(optimized))
+
+
+def expand_results(optimized_plan, results):
+    """
+    Map results of an optimized plan back onto the steps of the original plan.
+
+    Returns:
+        list: One result per original step, as execute_plan() would have returned
+    """
+    return [results[index] for index in optimized_plan.result_index]
@@ -1,8 +1,14 @@
 # streamlit_ic_shadow_agents.py
 
 import os
+import hashlib
 import json
+import math
+import queue
 import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
 import streamlit as st
@@ -25,6 +31,176 @@ def get_client():
     return aisuite.Client()
 
 
+def complete_chat(client, messages: list, on_text=None, turn_cache=None) -> tuple:
+    """
+    Run a chat completion and return (text, usage).
+
+    If on_text is given, the response is streamed and on_text is called with the
+    text received so far after every chunk. Streamed usage comes from the final
+    chunk (include_usage); it is None if the provider does not send one.
+
+    With a TurnCache, a previously seen request is answered from disk without
+    calling the model; usage is then TURN_CACHE_HIT.
+    """
+    if turn_cache is not None:
+        key = turn_cache.key(MODEL_NAME, messages)
+        text = turn_cache.get(key)
+        if text is not None:
+            if on_text is not None:
+                on_text(text)
+            return text, TURN_CACHE_HIT
+        text, usage = complete_chat(client, messages, on_text)
+        # An empty reply is a failed call, not an answer worth replaying
+        if text and text.strip():
+            turn_cache.put(key, text)
+        return text, usage
+
+    if on_text is None:
+        response = client.chat.completions.create(model=MODEL_NAME, messages=messages)
+        return response.choices[0].message.content, getattr(response, "usage", None)
+
+    text = ""
+    usage = None
+    stream = client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = chunk.usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            text += delta
+            on_text(text)
+    return text, usage
+
+
+def usage_record(call: str, usage) -> dict:
+    """
+    Token counts of one call, including prompt tokens served from the provider's prefix cache.
+    Calls answered from the turn cache cost no tokens.
+    """
+    if usage is TURN_CACHE_HIT:
+        return {"call": call, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "turn_cache": True}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "call": call,
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "turn_cache": False,
+    }
+
+
+# ========= TURN CACHE =========
+
+TURN_CACHE_DIR = os.getenv("SHADOW_IC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "shadow_ic"))
+TURN_CACHE_MAX_MB = float(os.getenv("SHADOW_IC_CACHE_MB", "100"))
+
+# Stands in for the response usage of a call answered from the turn cache
+TURN_CACHE_HIT = object()
+
+
+class TurnCache:
+    """
+    Disk-backed, content-addressed cache of model outputs (debate turns and checklists).
+
+    The key is a SHA-256 of the model name and the exact messages sent, which
+    include the memo text, deal name, crossfire instructions, role and the
+    transcript so far. Rerunning the same memo therefore replays every turn
+    from disk, and adding a round only calls the model for the new turns.
+
+    Each entry is one JSON file. When the directory grows past max_bytes the
+    least recently used entries are deleted.
+    """
+
+    def __init__(self, directory: str = TURN_CACHE_DIR, max_bytes: int = int(TURN_CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self) -> list:
+        return [entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")]
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    @staticmethod
+    def key(model: str, messages: list) -> str:
+        payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = json.load(f)["text"]
+            os.utime(path)  # mark as recently used
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        # Unique temp name per thread, then an atomic rename, so readers never see half a file
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"text": text}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used entries until the cache is under 90% of max_bytes."""
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._size <= 0.9 * self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> int:
+        """Delete every entry. Returns the number removed."""
+        with self._lock:
+            removed = 0
+            for entry in self._entries():
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+            self._size = 0
+        return removed
+
+
+@st.cache_resource
+def get_turn_cache() -> TurnCache:
+    """
+    The app's turn cache, in SHADOW_IC_CACHE_DIR (default ~/.cache/shadow_ic),
+    bounded by SHADOW_IC_CACHE_MB (default 100).
+    """
+    return TurnCache()
+
+
 # ========= LOGGING HELPERS (STREAMLIT VERSION) =========
 
 def log_agent_title_html(title, icon="🧠"):
@@ -50,103 +226,444 @@ def log_final_summary_html():
     )
 
 
+# ========= MEMO SECTION RETRIEVAL =========
+
+# Extra search terms per role, on top of its description in IC_ROLES
+ROLE_RETRIEVAL_TERMS = {
+    "Portfolio Manager": "returns yield spread pricing fees OID relative value sizing hold exposure portfolio concentration",
+    "Credit Risk Officer": "EBITDA leverage debt interest coverage cash flow liquidity revolver collateral default recovery",
+    "Documentation Counsel": "covenant maintenance incurrence basket restricted payments leakage guarantor lien amendment",
+    "Macro & Sector Analyst": "industry market sector cyclical demand customers competition inflation rates commodity",
+}
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:[&'][a-z0-9]+)*")
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.*)$")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in into is it its of on or our that the their this to "
+    "was were will with which we".split()
+)
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # token budgets fall back to a ~4 characters/token estimate
+    _ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    if _ENCODING is None:
+        return len(text) // 4 + 1
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if _ENCODING is None:
+        return text[:max_tokens * 4]
+    return _ENCODING.decode(_ENCODING.encode(text, disallowed_special=())[:max_tokens])
+
+
+def _terms(text: str) -> list:
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in _STOPWORDS]
+
+
+class MemoIndex:
+    """
+    BM25 index over the sections of one memo.
+
+    The memo is split on Markdown headings and then on blank lines, so each
+    chunk is a paragraph (or list, or table) under its heading. Headings are
+    indexed with every paragraph beneath them.
+    """
+
+    def __init__(self, memo_text: str, k1: float = 1.5, b: float = 0.75):
+        self.chunks = []    # (heading, text)
+        heading = ""
+        for block in re.split(r"\n\s*\n", memo_text):
+            lines = block.strip().splitlines()
+            # A heading line starts a new section; any text after it is its first paragraph
+            while lines and _HEADING_RE.match(lines[0]):
+                heading = _HEADING_RE.match(lines[0]).group(1).strip()
+                lines = lines[1:]
+            if lines:
+                self.chunks.append((heading, "\n".join(lines)))
+
+        self.k1, self.b = k1, b
+        self._term_counts = [Counter(_terms(f"{heading} {text}")) for heading, text in self.chunks]
+        self._lengths = [sum(counts.values()) for counts in self._term_counts]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        doc_freq = Counter(term for counts in self._term_counts for term in counts)
+        n_chunks = len(self.chunks)
+        self._idf = {
+            term: math.log(1 + (n_chunks - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()
+        }
+        self._tokens = [count_tokens(self.format_chunk(i)) for i in range(n_chunks)]
+
+    def format_chunk(self, i: int) -> str:
+        heading, text = self.chunks[i]
+        return f"## {heading}\n{text}" if heading else text
+
+    def scores(self, query: str) -> list:
+        query_terms = set(_terms(query))
+        scores = []
+        for counts, length in zip(self._term_counts, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self._avg_length or 1))
+            scores.append(sum(
+                self._idf[term] * counts[term] * (self.k1 + 1) / (counts[term] + norm)
+                for term in query_terms if term in counts
+            ))
+        return scores
+
+    def summary_chunks(self) -> list:
+        """
+        Indices of the memo's summary section (the first heading mentioning "summary"),
+        or of its first chunk if there is none.
+        """
+        for start, (heading, _) in enumerate(self.chunks):
+            if "summary" in heading.lower():
+                end = start
+                while end < len(self.chunks) and self.chunks[end][0] == heading:
+                    end += 1
+                return list(range(start, end))
+        return [0] if self.chunks else []
+
+    def select(self, query: str, token_budget: int, always=()) -> dict:
+        """
+        The `always` chunks and then the best matches for query, within token_budget.
+
+        Returns {chunk index: text} in memo order. The `always` chunks and the best
+        match are cut short (ending in [...]) if they do not fit; other matches that
+        do not fit are skipped. Chunks that do not match are never added, so budget
+        the relevant sections do not need stays unused.
+        """
+        scores = self.scores(query)
+        matched = sorted((i for i in range(len(self.chunks)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+        truncatable = {*always, *matched[:1]}
+        chosen, used = {}, 0
+        for i in [*always, *matched]:
+            if i in chosen:
+                continue
+            if used + self._tokens[i] <= token_budget:
+                chosen[i] = self.chunks[i][1]
+                used += self._tokens[i]
+            elif i in truncatable:
+                heading, text = self.chunks[i]
+                room = token_budget - used - count_tokens(f"## {heading}\n [...]")
+                if room > 0:
+                    chosen[i] = f"{truncate_tokens(text, room)} [...]"
+                    used = token_budget
+        return dict(sorted(chosen.items()))
+
+    def render(self, selection: dict) -> str:
+        """
+        Selected chunk texts (see select) in memo order, repeating a heading only
+        when it changes. Gaps between non-adjacent chunks are marked with [...].
+        """
+        parts, last_heading, previous = [], None, None
+        for i, text in selection.items():
+            heading = self.chunks[i][0]
+            if previous is not None and i != previous + 1:
+                parts.append("[...]")
+            if heading and heading != last_heading:
+                parts.append(f"## {heading}")
+            parts.append(text)
+            last_heading, previous = heading, i
+        return "\n\n".join(parts)
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def index_memo(memo_text: str) -> MemoIndex:
+    """
+    Build (once per memo text) the section index used for role-targeted retrieval.
+    """
+    return MemoIndex(memo_text)
+
+
+def _role_query(role_name: str, description: str) -> str:
+    # Title words ("Credit Risk Officer") would match the memo's own title, not the role's topics
+    role_words = set(_terms(role_name))
+    query = f"{description} {ROLE_RETRIEVAL_TERMS.get(role_name, '')}"
+    return " ".join(term for term in _terms(query) if term not in role_words)
+
+
+def _role_chunks(index: MemoIndex, role_name: str, description: str, token_budget: int) -> dict:
+    return index.select(_role_query(role_name, description), token_budget, always=index.summary_chunks())
+
+
+def role_memo_sections(memo_text: str, role_name: str, description: str, token_budget: int) -> str:
+    """
+    The memo's summary and the sections most relevant to a role, up to token_budget tokens.
+
+    Sections that do not match the role are left out even if budget remains, so
+    each role gets only its own part of the memo.
+    """
+    index = index_memo(memo_text)
+    chosen = _role_chunks(index, role_name, description, token_budget)
+    if not chosen:
+        return memo_text[:token_budget * 4]
+    return index.render(chosen)
+
+
+def checklist_memo_sections(memo_text: str, token_budget: int) -> str:
+    """
+    Every section picked for any role (see role_memo_sections), in memo order, for the IC Chair.
+    """
+    index = index_memo(memo_text)
+    chosen = {}
+    for role_name, description in IC_ROLES:
+        for i, text in _role_chunks(index, role_name, description, token_budget).items():
+            # A chunk cut short for one role may be whole for another
+            if len(text) > len(chosen.get(i, "")):
+                chosen[i] = text
+    chosen = dict(sorted(chosen.items()))
+    if not chosen:
+        return memo_text[:token_budget * 4]
+    return index.render(chosen)
+
+
 # ========= CORE SHADOW IC LOGIC (FROM PROGRAM 1) =========
 
-def run_shadow_ic_debate(
-    memo_text: str,
-    deal_name: str = "Acme Industries",
-    rounds: int = 2,
-    crossfire: bool = True,
-) -> str:
+IC_ROLES = [
+    ("Portfolio Manager",
+     "Portfolio Manager focusing on risk/return, relative value, portfolio overlap, exposure sizing."),
+    ("Credit Risk Officer",
+     "Credit Risk Officer focusing on leverage, liquidity, coverage, asset quality and LGD dynamics."),
+    ("Documentation Counsel",
+     "Documentation Counsel focusing on covenants, baskets, leakage, remedies, and enforceability."),
+    ("Macro & Sector Analyst",
+     "Macro & Sector Analyst focusing on cycles, rate environment, commodity pricing, sector volatility and pass-through."),
+]
+
+# Shared by every debate turn and the checklist call, so together with the
+# memo block it forms the same prompt prefix on every request
+SHADOW_IC_SYSTEM_PROMPT = (
+    "You simulate realistic, technically detailed private credit Investment Committee work among "
+    "professionals: IC debates between committee members, and structured, critical challenge "
+    "checklists for deal teams."
+)
+
+
+def build_memo_context(memo_snippet: str, deal_name: str) -> str:
     """
-    Simulate a multi-agent Shadow IC debate with full professional role names.
+    Static leading block of every Shadow IC prompt: the deal, the memo and the ground rules.
 
-    If crossfire=True, agents are encouraged to respond directly to prior comments,
-    not just the memo.
+    It must not contain anything that changes between calls of one run (role,
+    transcript, round), so the provider can reuse the cached prompt tokens.
     """
 
-    log_agent_title_html("Shadow IC Debate", "🧮")
+    return f"""
+Private credit Shadow Investment Committee for the deal "{deal_name}".
 
-    roles = [
-        ("Portfolio Manager",
-         "Portfolio Manager focusing on risk/return, relative value, portfolio overlap, exposure sizing."),
-        ("Credit Risk Officer",
-         "Credit Risk Officer focusing on leverage, liquidity, coverage, asset quality and LGD dynamics."),
-        ("Documentation Counsel",
-         "Documentation Counsel focusing on covenants, baskets, leakage, remedies, and enforceability."),
-        ("Macro & Sector Analyst",
-         "Macro & Sector Analyst focusing on cycles, rate environment, commodity pricing, sector volatility and pass-through."),
-    ]
+Committee members:
+- Portfolio Manager (PM)
+- Credit Risk Officer (CRO)
+- Documentation Counsel (DOC)
+- Macro & Sector Analyst (MACRO)
 
-    transcript = []
-    memo_snippet = memo_text[:12000]   # keep prompt manageable
+Investment Committee memo under review (for the deal team presentation):
+
+MEMO_START
+{memo_snippet}
+MEMO_END
+
+Ground rules for everything you write:
+- Focus only on what is contained in the memo (no external data).
+- Refer to memo sections when appropriate.
+"""
+
+
+def build_messages(memo_context: str, task_prompt: str) -> list:
+    """
+    Chat messages with the shared system prompt and memo block first, then the call-specific task.
+    """
+
+    return [
+        {"role": "system", "content": SHADOW_IC_SYSTEM_PROMPT},
+        {"role": "user", "content": memo_context + task_prompt},
+    ]
 
-    client = get_client()
 
-    for r in range(rounds):
-        for role_name, description in roles:
-            # Only feed a window of the last few comments for context
-            previous_discussion = "\n".join(transcript[-16:]) if transcript else "(none yet)"
+def build_debate_turn_prompt(
+    role_name: str,
+    description: str,
+    previous_discussion: str,
+    crossfire: bool,
+) -> str:
+    """
+    Build the part of a debate turn prompt that follows the memo block:
+    the discussion so far, then the role's instructions.
+    """
 
-            crossfire_instructions = (
-                """
+    crossfire_instructions = (
+        """
 - Explicitly reference one or two prior comments if relevant (agree, disagree, or extend them).
 - If you disagree, explain why briefly but clearly.
 - You can call out other roles by name, e.g. "As the Credit Risk Officer noted..." or "I disagree with the Portfolio Manager on sizing because...".
 """
-                if crossfire
-                else """
+        if crossfire
+        else """
 - You may mention that others have raised points, but you do NOT need to directly react to them.
 """
-            )
+    )
+
+    return f"""
+Shadow IC discussion so far:
+{previous_discussion}
 
-            prompt = f"""
-You are acting as **{role_name}** in a private credit Shadow Investment Committee for the deal "{deal_name}".
+You are acting as **{role_name}** in this Shadow Investment Committee.
 
 Your perspective:
 {description}
 
-You are reviewing the following Investment Committee memo:
-
-MEMO_START
-{memo_snippet}
-MEMO_END
-
-Shadow IC discussion so far:
-{previous_discussion}
-
 Your task:
 - Provide one concise, pointed comment (3–6 sentences max).
-- Focus only on what is contained in the memo (no external data).
 - Critique assumptions, highlight risks, challenge structure, or support the deal based on your role.
-- Refer to memo sections when appropriate.
 {crossfire_instructions}
 - Start your comment EXACTLY with "[{role_name}]:".
 - Output ONLY your comment.
 """
 
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You simulate realistic, technically detailed private credit IC debates among professionals."
-                        ),
-                    },
-                    {"role": "user", "content": prompt},
-                ],
+
+def generate_debate_turn(client, role_name: str, messages: list, on_text=None, turn_cache=None) -> tuple:
+    """
+    Run one debate turn.
+
+    If on_text is given, the response is streamed and on_text receives the
+    text so far as tokens arrive. A TurnCache answers repeated turns from disk.
+
+    Returns:
+      (comment with its bolded role tag, response usage or None)
+    """
+
+    output, usage = complete_chat(client, messages, on_text, turn_cache)
+    output = output.strip()
+
+    # Ensure the role tag is present
+    if not output.startswith(f"[{role_name}]"):
+        output = f"[{role_name}]: " + output
+
+    # Bold the role tag for nicer Markdown
+    return output.replace(f"[{role_name}]:", f"**[{role_name}]:**", 1), usage
+
+
+def run_shadow_ic_debate(
+    memo_text: str,
+    deal_name: str = "Acme Industries",
+    rounds: int = 2,
+    crossfire: bool = True,
+    parallel_roles: bool = False,
+    stream: bool = False,
+    usage_log: list | None = None,
+    memo_token_budget: int | None = None,
+    turn_cache: TurnCache | None = None,
+) -> str:
+    """
+    Simulate a multi-agent Shadow IC debate with full professional role names.
+
+    If crossfire=True, agents are encouraged to respond directly to prior comments,
+    not just the memo.
+
+    If parallel_roles=True, the four roles in a round are generated at the same
+    time and each sees the discussion from earlier rounds only, so a round takes
+    about as long as one call. The transcript keeps the usual role order.
+    Otherwise each role also sees the comments made earlier in its own round.
+
+    If stream=True, each comment is rendered into its own placeholder token by
+    token as it is generated.
+
+    Every turn's prompt starts with the same system prompt and memo block (see
+    build_memo_context), so providers with prefix caching bill and serve it from
+    cache after the first call. Pass a list as usage_log to collect each turn's
+    token counts, including cached prompt tokens (see usage_record).
+
+    By default every role sees the first 12,000 characters of the memo. With
+    memo_token_budget set, each role instead gets the memo sections most
+    relevant to it, up to that many tokens (see role_memo_sections). The memo
+    block then differs between roles but stays the same for a role across
+    rounds, so it is still served from the prompt cache from round 2 on.
+
+    With a TurnCache, turns whose exact prompt was seen before are read from
+    disk, so a rerun with one more round only generates the new turns.
+    """
+
+    log_agent_title_html("Shadow IC Debate", "🧮")
+
+    transcript = []
+    if memo_token_budget:
+        memo_contexts = {
+            role_name: build_memo_context(
+                role_memo_sections(memo_text, role_name, description, memo_token_budget), deal_name
             )
+            for role_name, description in IC_ROLES
+        }
+    else:
+        memo_snippet = memo_text[:12000]   # keep prompt manageable
+        memo_context = build_memo_context(memo_snippet, deal_name)
+        memo_contexts = {role_name: memo_context for role_name, _ in IC_ROLES}
 
-            output = response.choices[0].message.content.strip()
+    client = get_client()
 
-            # Ensure the role tag is present
-            if not output.startswith(f"[{role_name}]"):
-                output = f"[{role_name}]: " + output
+    def previous_discussion() -> str:
+        # Only feed a window of the last few comments for context
+        return "\n".join(transcript[-16:]) if transcript else "(none yet)"
 
-            # Bold the role tag for nicer Markdown
-            formatted = output.replace(f"[{role_name}]:", f"**[{role_name}]:**", 1)
-            transcript.append(formatted)
+    def turn_messages(role_name: str, description: str, discussion_so_far: str) -> list:
+        return build_messages(
+            memo_contexts[role_name],
+            build_debate_turn_prompt(role_name, description, discussion_so_far, crossfire),
+        )
+
+    def record_usage(r: int, role_name: str, usage) -> None:
+        if usage_log is not None:
+            usage_log.append(usage_record(f"Round {r + 1} – {role_name}", usage))
+
+    if parallel_roles:
+        with ThreadPoolExecutor(max_workers=len(IC_ROLES)) as pool:
+            for r in range(rounds):
+                discussion_so_far = previous_discussion()
+                placeholders = [st.empty() for _ in IC_ROLES] if stream else None
+                # Streamlit calls must stay on this thread, so workers queue their text
+                updates = queue.Queue()
+                futures = [
+                    pool.submit(
+                        generate_debate_turn,
+                        client,
+                        role_name,
+                        turn_messages(role_name, description, discussion_so_far),
+                        (lambda text, i=i: updates.put((i, text))) if stream else None,
+                        turn_cache,
+                    )
+                    for i, (role_name, description) in enumerate(IC_ROLES)
+                ]
+                if stream:
+                    pending = set(futures)
+                    while pending:
+                        _, pending = wait(pending, timeout=0.1)
+                        while not updates.empty():
+                            i, text = updates.get()
+                            placeholders[i].markdown(text)
+                # Collect in role order so the transcript is the same on every run
+                for i, future in enumerate(futures):
+                    turn, usage = future.result()
+                    if stream:
+                        placeholders[i].markdown(turn)
+                    record_usage(r, IC_ROLES[i][0], usage)
+                    transcript.append(turn)
+    else:
+        for r in range(rounds):
+            for role_name, description in IC_ROLES:
+                placeholder = st.empty() if stream else None
+                turn, usage = generate_debate_turn(
+                    client,
+                    role_name,
+                    turn_messages(role_name, description, previous_discussion()),
+                    placeholder.markdown if stream else None,
+                    turn_cache,
+                )
+                if stream:
+                    placeholder.markdown(turn)
+                record_usage(r, role_name, usage)
+                transcript.append(turn)
 
     # Add readable spacing between turns
     full_discussion = "\n\n".join(transcript)
@@ -156,40 +673,44 @@ Your task:
 def build_shadow_ic_checklist(
     memo_text: str,
     discussion: str,
-    deal_name: str = "Acme Industries"
+    deal_name: str = "Acme Industries",
+    stream: bool = False,
+    usage_log: list | None = None,
+    memo_token_budget: int | None = None,
+    turn_cache: TurnCache | None = None,
 ) -> str:
     """
     Build a structured checklist of IC-style questions and gaps
     based on the memo and the shadow IC discussion.
+
+    With memo_token_budget set, the IC Chair sees every memo section picked
+    for any role (see checklist_memo_sections) instead of the first 12,000 characters.
+
+    If stream=True, the checklist is rendered into a placeholder as it is generated.
+    The prompt starts with the same memo block as the debate turns, so it reuses
+    their cached prefix; usage_log collects its token counts.
     """
 
     log_agent_title_html("Shadow IC Challenge Checklist", "📋")
 
-    memo_snippet = memo_text[:12000]
+    if memo_token_budget:
+        memo_snippet = checklist_memo_sections(memo_text, memo_token_budget)
+    else:
+        memo_snippet = memo_text[:12000]
     discussion_snippet = discussion[-12000:]
 
     prompt = f"""
-You are acting as the IC Chair of a private credit Investment Committee for the deal "{deal_name}".
-
-You have:
-1) The Investment Committee memo (for the deal team presentation).
-2) A transcript of a Shadow IC discussion between:
-   - Portfolio Manager (PM)
-   - Credit Risk Officer (CRO)
-   - Documentation Counsel (DOC)
-   - Macro / Sector Specialist (MACRO)
-
-Your job is to convert this into a practical, structured checklist
-the deal team must address BEFORE going to a real IC.
-
-MEMO_START
-{memo_snippet}
-MEMO_END
+A transcript of the Shadow IC discussion between the committee members:
 
 DISCUSSION_START
 {discussion_snippet}
 DISCUSSION_END
 
+You are acting as the IC Chair of this private credit Investment Committee.
+
+Your job is to convert the memo and the discussion into a practical, structured checklist
+the deal team must address BEFORE going to a real IC.
+
 Output in Markdown with this structure:
 
 Shadow IC Challenge Checklist for the Deal Team – {deal_name}
@@ -222,21 +743,17 @@ Guidelines:
 - Do NOT introduce external facts; you can only critique or question what is in the memo.
 """
 
+    messages = build_messages(build_memo_context(memo_snippet, deal_name), prompt)
+
     client = get_client()
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an IC Chair who produces structured, critical checklists for private credit deal teams."
-                ),
-            },
-            {"role": "user", "content": prompt},
-        ],
-    )
+    placeholder = st.empty() if stream else None
+    checklist, usage = complete_chat(client, messages, placeholder.markdown if stream else None, turn_cache)
+    checklist = checklist.strip()
+    if stream:
+        placeholder.markdown(checklist)
+    if usage_log is not None:
+        usage_log.append(usage_record("Checklist", usage))
 
-    checklist = response.choices[0].message.content.strip()
     return checklist
 
 
@@ -245,10 +762,21 @@ def run_shadow_ic_from_text(
     deal_name: str = "Acme Industries",
     rounds: int = 2,
     crossfire: bool = True,
+    parallel_roles: bool = False,
+    stream: bool = False,
+    usage_log: list | None = None,
+    memo_token_budget: int | None = None,
+    turn_cache: TurnCache | None = None,
 ) -> tuple[str, str, str]:
     """
     End-to-end Shadow IC pipeline starting from memo text.
 
+    With stream=True every comment and the checklist appear on the page as
+    they are generated; the full texts are still returned at the end.
+    Pass a list as usage_log to collect the token counts of every call, and
+    memo_token_budget to send each role only its relevant memo sections.
+    Pass a TurnCache to reuse turns and checklists from earlier runs.
+
     Returns:
       discussion, checklist, full_output_markdown
     """
@@ -260,12 +788,21 @@ def run_shadow_ic_from_text(
         deal_name=deal_name,
         rounds=rounds,
         crossfire=crossfire,
+        parallel_roles=parallel_roles,
+        stream=stream,
+        usage_log=usage_log,
+        memo_token_budget=memo_token_budget,
+        turn_cache=turn_cache,
     )
 
     checklist = build_shadow_ic_checklist(
         memo_text=memo_text,
         discussion=discussion,
         deal_name=deal_name,
+        stream=stream,
+        usage_log=usage_log,
+        memo_token_budget=memo_token_budget,
+        turn_cache=turn_cache,
     )
 
     full_output = f"""# Shadow IC Review – {deal_name}
@@ -300,6 +837,8 @@ if "checklist" not in st.session_state:
     st.session_state.checklist = None
 if "full_output" not in st.session_state:
     st.session_state.full_output = None
+if "usage" not in st.session_state:
+    st.session_state.usage = None
 
 # API key similar to Program 2
 api_key = st.text_input(
@@ -322,6 +861,36 @@ with col_right:
         value=True,
         help="If enabled, roles explicitly respond to prior comments.",
     )
+    parallel_roles = st.checkbox(
+        "Run the four roles in parallel within each round",
+        value=False,
+        help="Faster: each round takes about one model call, but roles only see earlier rounds, not each other's comments in the same round.",
+    )
+    stream_output = st.checkbox(
+        "Stream comments as they are written",
+        value=True,
+        help="Show each role's comment and the checklist token by token instead of waiting for the whole run.",
+    )
+    targeted_memo = st.checkbox(
+        "Send each role only its relevant memo sections",
+        value=False,
+        help="Index the memo by heading and paragraph and give each role the sections that match its focus, instead of the first 12,000 characters.",
+    )
+    memo_token_budget = st.number_input(
+        "Memo tokens per role",
+        min_value=500,
+        max_value=8000,
+        value=2000,
+        step=250,
+        disabled=not targeted_memo,
+    )
+    use_turn_cache = st.checkbox(
+        "Reuse cached turns",
+        value=True,
+        help="Replay turns and checklists already generated for the same memo, deal, settings and discussion so far. Untick to regenerate everything.",
+    )
+    if st.button("Clear turn cache"):
+        st.caption(f"Removed {get_turn_cache().clear()} cached turns.")
 
     memo_mode = st.radio(
         "How do you want to provide the IC memo?",
@@ -347,6 +916,8 @@ with col_left:
         )
 
 run_button = st.button("Run Shadow IC")
+# Set when this run already rendered the discussion and checklist live
+streamed_this_run = False
 
 if run_button:
     # Basic validation
@@ -367,13 +938,21 @@ if run_button:
 
         if memo_text and memo_text.strip():
             try:
+                usage_log = []
                 with st.spinner("Running Shadow IC pipeline..."):
                     discussion, checklist, full_output = run_shadow_ic_from_text(
                         memo_text=memo_text,
                         deal_name=deal_name or "Acme Industries",
                         rounds=rounds,
                         crossfire=crossfire,
+                        parallel_roles=parallel_roles,
+                        stream=stream_output,
+                        usage_log=usage_log,
+                        memo_token_budget=int(memo_token_budget) if targeted_memo else None,
+                        turn_cache=get_turn_cache() if use_turn_cache else None,
                     )
+                streamed_this_run = stream_output
+                st.session_state.usage = usage_log
 
                 st.session_state.discussion = discussion
                 st.session_state.checklist = checklist
@@ -386,7 +965,7 @@ if run_button:
             st.warning("Memo is empty. Please upload a file or paste memo text.")
 
 # Show results if present
-if st.session_state.discussion or st.session_state.checklist:
+if (st.session_state.discussion or st.session_state.checklist) and not streamed_this_run:
     st.subheader("Part 1 – Shadow IC Discussion")
     if st.session_state.discussion:
         st.markdown(st.session_state.discussion)
@@ -395,12 +974,27 @@ if st.session_state.discussion or st.session_state.checklist:
     if st.session_state.checklist:
         st.markdown(st.session_state.checklist)
 
-    # Download button for Markdown
-    if st.session_state.full_output:
-        default_filename = f"{(deal_name or 'Deal').replace(' ', '_')}_ShadowIC_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
-        st.download_button(
-            "Download full Shadow IC output (Markdown)",
-            data=st.session_state.full_output,
-            file_name=default_filename,
-            mime="text/markdown",
+# Token usage, to confirm the memo prefix is served from the provider's cache
+if st.session_state.usage:
+    prompt_tokens = sum(record["prompt_tokens"] or 0 for record in st.session_state.usage)
+    cached_tokens = sum(record["cached_tokens"] for record in st.session_state.usage)
+    turn_cache_hits = sum(record["turn_cache"] for record in st.session_state.usage)
+    turn_cache = get_turn_cache()
+    with st.expander("Token usage and prompt caching"):
+        st.caption(
+            f"{cached_tokens:,} of {prompt_tokens:,} prompt tokens were served from the provider's prompt cache"
+            + (f" ({cached_tokens / prompt_tokens:.0%})." if prompt_tokens else ".")
+            + f" {turn_cache_hits} of {len(st.session_state.usage)} calls were replayed from the turn cache."
+            + f" Turn cache since the app started: {turn_cache.hits} hits, {turn_cache.misses} misses."
         )
+        st.dataframe(st.session_state.usage)
+
+# Download button for Markdown
+if st.session_state.full_output:
+    default_filename = f"{(deal_name or 'Deal').replace(' ', '_')}_ShadowIC_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
+    st.download_button(
+        "Download full Shadow IC output (Markdown)",
+        data=st.session_state.full_output,
+        file_name=default_filename,
+        mime="text/markdown",
+    )